@@ -2,32 +2,55 @@
 
 # NOTE: This application requires: pip install Pillow Flask-SQLAlchemy Flask-Login Werkzeug Authlib google-analytics-data bleach cssutils sendgrid pyppeteer
 import requests
-from flask import Flask, render_template, request, jsonify, Response, send_file, redirect, url_for, flash, send_from_directory, session
+from flask import Flask, render_template, request, jsonify, Response, send_file, redirect, url_for, flash, send_from_directory, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature
 from authlib.integrations.flask_client import OAuth
 from bs4 import BeautifulSoup
-from bs4.element import Tag
+from lxml import etree
 import re
 import asyncio
 from pyppeteer import launch
-from urllib.parse import urljoin, unquote, urlparse, parse_qs
+from pyppeteer.errors import TimeoutError as PyppeteerTimeoutError
+from urllib.parse import urljoin, unquote, urlparse, parse_qs, parse_qsl, urlencode, urlunparse
 import traceback
 import time
-import webcolors
+import numpy as np
 from PIL import Image, UnidentifiedImageError
 import io
 import os
 import sys # Added for asyncio workaround
-from typing import Optional, Set, List, Dict, Tuple, Any, Union
+import threading
+import queue
+import atexit
+from contextlib import asynccontextmanager, contextmanager, ExitStack, AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import signal
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import uuid
+import hashlib
+import ipaddress
+import socket
+import math
+import gzip
+import sqlite3
+from cachetools import TTLCache
+import psutil
+from typing import Optional, Set, List, Dict, Tuple, Any, Union, Callable
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import wraps, lru_cache
 import click
 import shutil
 import tempfile
+import zipfile
 from sqlalchemy import func, and_, or_
 from werkzeug.exceptions import RequestEntityTooLarge
 import logging
@@ -48,6 +71,10 @@ from flask_wtf.csrf import CSRFProtect
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, From
 import subprocess # NEW IMPORT for running external tools
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, the pool still isolates the work
+    resource = None
 
 load_dotenv()
 
@@ -69,6 +96,10 @@ app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
+# Reverse proxies in front of the app. Their X-Forwarded-For/-Proto are trusted so that
+# request.remote_addr is the real client, which per-client limits rely on.
+TRUSTED_PROXY_COUNT: int = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+if TRUSTED_PROXY_COUNT: app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT, x_proto=TRUSTED_PROXY_COUNT)
 
 @app.errorhandler(413)
 @app.errorhandler(RequestEntityTooLarge)
@@ -417,34 +448,372 @@ def get_google_analytics_data(property_id, reports: List[str] = ['overview']):
         traceback.print_exc()
         return None
 
-GOOGLE_FONTS_API_CACHE: Optional[Dict[str, str]] = None
+# --- START: SHARED OUTBOUND HTTP CLIENT ---
+OUTBOUND_MAX_PER_HOST: int = int(os.environ.get('OUTBOUND_MAX_PER_HOST', 8))
+OUTBOUND_MAX_RETRIES: int = int(os.environ.get('OUTBOUND_MAX_RETRIES', 2))
+OUTBOUND_MAX_RESPONSE_BYTES: int = int(os.environ.get('OUTBOUND_MAX_RESPONSE_BYTES', 25 * 1024 * 1024))
+# Points every outbound call at one origin (e.g. a local stand-in server in tests). The real host goes in X-Original-Host.
+OUTBOUND_HTTP_OVERRIDE: str = os.environ.get('OUTBOUND_HTTP_OVERRIDE', '')
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+class BlockedDestination(requests.RequestException):
+    """The URL points at a loopback, private, link-local or otherwise non-public address."""
+
+def ensure_public_url(url: str) -> None:
+    """Resolves the URL's host and raises BlockedDestination unless every address it maps to is public."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not (host := parsed.hostname):
+        raise BlockedDestination(f"Unsupported URL: {url}")
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == 'https' else 80), proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise requests.ConnectionError(f"Could not resolve {host}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped: address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise BlockedDestination(f"{host} resolves to non-public address {address}")
+
+class OutboundHTTPClient:
+    """The one place the app talks to other servers.
+
+    Wraps a keep-alive requests.Session with per-host connection pools, bounded retries with
+    backoff for idempotent calls, a per-host concurrency cap, a response size cap and
+    per-host timing metrics.
+    """
+
+    def __init__(self, max_per_host: int, max_retries: int, max_response_bytes: int, override: str = ''):
+        self.max_per_host = max_per_host
+        self.max_response_bytes = max_response_bytes
+        self.override = urlparse(override) if override else None
+        retry = Retry(total=max_retries, connect=max_retries, read=max_retries, status=max_retries, backoff_factor=0.3,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset({'GET', 'HEAD'}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=max_per_host, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots: self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _record(self, host: str, started: float, received: int, failed: bool) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            stats = self._metrics.setdefault(host, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'bytes': 0})
+            stats['calls'] += 1
+            stats['errors'] += int(failed)
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['bytes'] += received
+        app.logger.debug(f"Outbound {host}: {elapsed_ms:.0f} ms, {received} bytes{' (failed)' if failed else ''}")
+
+    def metrics_snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {host: dict(stats, avg_ms=round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0) for host, stats in self._metrics.items()}
+
+    def _rewrite(self, url: str, headers: Dict[str, str]) -> str:
+        if not self.override: return url
+        parsed = urlparse(url)
+        headers.setdefault('X-Original-Host', parsed.netloc)
+        return urlunparse(parsed._replace(scheme=self.override.scheme, netloc=self.override.netloc))
+
+    @contextmanager
+    def stream(self, method: str, url: str, timeout: float = 10, max_bytes: Optional[int] = None, **kwargs: Any):
+        """Yields a streaming response while holding one of the host's connection slots."""
+        headers = dict(kwargs.pop('headers', None) or {})
+        url = self._rewrite(url, headers)
+        host = urlparse(url).netloc.lower()
+        slot = self._slot(host)
+        if not slot.acquire(timeout=timeout):
+            raise requests.Timeout(f"Timed out waiting for a connection slot to {host}")
+        started, failed, resp = time.perf_counter(), True, None
+        try:
+            resp = self.session.request(method, url, headers=headers, timeout=timeout, stream=True, **kwargs)
+            with resp:
+                limit = max_bytes or self.max_response_bytes
+                if (declared := resp.headers.get('Content-Length', '')).isdigit() and int(declared) > limit:
+                    raise ResponseTooLarge(f"{url} declares {declared} bytes, over the {limit} byte limit")
+                resp.max_bytes, resp.bytes_received = limit, 0
+                yield resp
+                failed = False
+        finally:
+            self._record(host, started, getattr(resp, 'bytes_received', 0), failed)
+            slot.release()
+
+    @staticmethod
+    def iter_capped(resp: requests.Response, chunk_size: int = 64 * 1024):
+        """Iterates a streaming body, raising ResponseTooLarge once it passes the response's byte limit."""
+        for chunk in resp.iter_content(chunk_size):
+            resp.bytes_received += len(chunk)
+            if resp.bytes_received > resp.max_bytes:
+                raise ResponseTooLarge(f"{resp.url} exceeded the {resp.max_bytes} byte limit")
+            yield chunk
+
+    def request(self, method: str, url: str, timeout: float = 10, max_bytes: Optional[int] = None, **kwargs: Any) -> requests.Response:
+        """Performs a call and returns the response with its (size-capped) body already read."""
+        with self.stream(method, url, timeout=timeout, max_bytes=max_bytes, **kwargs) as resp:
+            resp._content = b''.join(self.iter_capped(resp))
+            return resp
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    @contextmanager
+    def stream_public(self, method: str, url: str, max_redirects: int = 3, **kwargs: Any):
+        """stream() for user-supplied URLs: refuses non-public destinations, re-checking every redirect hop."""
+        for _ in range(max_redirects + 1):
+            ensure_public_url(url)
+            with self.stream(method, url, allow_redirects=False, **kwargs) as resp:
+                if not resp.is_redirect:
+                    yield resp
+                    return
+                location = resp.headers['Location']
+            url = urljoin(url, location)
+        raise requests.TooManyRedirects(f"More than {max_redirects} redirects")
+
+    def get_public(self, url: str, max_redirects: int = 3, **kwargs: Any) -> requests.Response:
+        with self.stream_public('GET', url, max_redirects, **kwargs) as resp:
+            resp._content = b''.join(self.iter_capped(resp))
+            return resp
+
+OUTBOUND_HTTP = OutboundHTTPClient(OUTBOUND_MAX_PER_HOST, OUTBOUND_MAX_RETRIES, OUTBOUND_MAX_RESPONSE_BYTES, OUTBOUND_HTTP_OVERRIDE)
+# --- END: SHARED OUTBOUND HTTP CLIENT ---
+
+# --- START: EXTRACTION DEADLINES ---
+EXTRACTION_TIME_BUDGET: float = float(os.environ.get('EXTRACTION_TIME_BUDGET', 45))
+EXTRACTION_MAX_TIME_BUDGET: float = float(os.environ.get('EXTRACTION_MAX_TIME_BUDGET', 120))
+EXTRACTION_MIN_PHASE_SECONDS: float = 1.0
+# Fraction of the budget still left that each phase may spend, so early phases cannot starve later ones.
+EXTRACTION_PHASE_SHARES: Dict[str, float] = {
+    'static_fetch': 0.25, 'static_stylesheets': 0.3, 'browser': 0.5, 'navigate': 0.5, 'scroll': 0.35,
+    'snapshot': 0.25, 'styles': 0.6, 'fonts': 0.5, 'stylesheets': 0.5, 'dedupe': 0.5, 'probe': 0.5,
+}
+
+class ExtractionDeadline:
+    """One request's time budget, handed out to the scan phases a share at a time.
+
+    Phases that run out of time (or fail after the page has loaded) are recorded as incomplete
+    rather than raised, so the caller can still return the sections that did finish.
+    """
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.deadline = time.monotonic() + budget
+        self.timings: Dict[str, int] = {}
+        self.incomplete: List[str] = []
+
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'ExtractionDeadline':
+        try:
+            budget = float(options.get('time_budget') or EXTRACTION_TIME_BUDGET)
+        except (TypeError, ValueError):
+            budget = EXTRACTION_TIME_BUDGET
+        return cls(max(5.0, min(budget, EXTRACTION_MAX_TIME_BUDGET)))
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def allowance(self, phase: str) -> float:
+        """Seconds a phase may take: its share of what is left, at least a small floor, never more than what is left."""
+        remaining = self.remaining()
+        return min(remaining, max(EXTRACTION_MIN_PHASE_SECONDS, remaining * EXTRACTION_PHASE_SHARES.get(phase, 1.0)))
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + round((time.monotonic() - started) * 1000)
+
+    def mark_incomplete(self, phase: str, reason: str) -> None:
+        print(f"Extraction phase '{phase}' did not finish: {reason}")
+        if phase not in self.incomplete: self.incomplete.append(phase)
+
+    async def run_phase(self, name: str, awaitable: Any, fallback: Any = None, timeout: Optional[float] = None) -> Any:
+        """Awaits one phase within its allowance, returning ``fallback`` if it times out or fails."""
+        with self.phase(name):
+            try:
+                return await asyncio.wait_for(awaitable, timeout if timeout is not None else self.allowance(name))
+            except asyncio.TimeoutError:
+                self.mark_incomplete(name, 'time budget exhausted')
+            except Exception as e:
+                self.mark_incomplete(name, str(e))
+        return fallback
+
+    def meta(self) -> Dict[str, Any]:
+        meta: Dict[str, Any] = {'timings': dict(self.timings), 'time_budget': self.budget}
+        if self.incomplete: meta.update(partial=True, incomplete_phases=list(self.incomplete))
+        return meta
+# --- END: EXTRACTION DEADLINES ---
+
 MYFONTS_KNOWN_LIST: Set[str] = {'circular std', 'gt walsheim pro', 'avenir next', 'futura pt', 'neue haas unica', 'aktiv grotesk', 'brandon grotesque', 'gilroy', 'gotham', 'helvetica now', 'din next'}
 ICON_FONT_TERMS: Set[str] = {'icon', 'awesome', 'glyph', 'yootheme', 'eicons'}
 SYSTEM_FONTS: Set[str] = {'arial', 'helvetica neue', 'helvetica', 'times new roman', 'georgia', 'verdana', 'tahoma', '-apple-system', 'segoe ui'}
-SYSTEM_FONTS_CANONICAL = {re.sub(r'[\s_-]', '', s.lower()) for s in SYSTEM_FONTS}
+
+# --- START: GOOGLE FONTS CATALOG ---
+GOOGLE_FONTS_CATALOG_PATH = os.path.join(app.instance_path, 'google_fonts_catalog.json')
+GOOGLE_FONTS_REFRESH_INTERVAL: int = int(os.environ.get('GOOGLE_FONTS_REFRESH_INTERVAL', 24 * 3600))
+GOOGLE_FONTS_RETRY_INTERVAL: int = int(os.environ.get('GOOGLE_FONTS_RETRY_INTERVAL', 15 * 60))
+GOOGLE_FONTS_LOCK_STALE_AFTER: int = 120
+# How long a worker with no snapshot yet waits for another process's first refresh to land.
+GOOGLE_FONTS_FIRST_LOAD_WAIT: float = float(os.environ.get('GOOGLE_FONTS_FIRST_LOAD_WAIT', 15))
+GOOGLE_FONTS_API_URL = "https://www.googleapis.com/webfonts/v1/webfonts"
+
+class GoogleFontsCatalog:
+    """The Google Fonts catalog as a JSON snapshot on disk, shared by every worker.
+
+    Workers load the snapshot (and reload it when another worker replaces it) and refresh it in a
+    background thread once it is older than the refresh interval, using a lock file so only one
+    process talks to the API at a time. Refreshes are conditional (ETag / Last-Modified), and a failed
+    one keeps the last good snapshot and is retried after a shorter interval.
+    """
+
+    def __init__(self, path: str, refresh_interval: int, retry_interval: int):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._mtime: Optional[float] = None
+        self._families: Dict[str, str] = {}
+        self._refreshing = False
+        self._retry_after = 0.0
+
+    def _load(self) -> None:
+        """Re-reads the snapshot if the file on disk changed since the last read."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime: return
+        try:
+            with open(self.path) as f: snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not read Google Fonts catalog {self.path}: {e}")
+            return
+        with self._lock:
+            self._snapshot, self._mtime = snapshot, mtime
+            self._families = {font['family'].lower(): font['family'] for font in snapshot.get('fonts', [])}
+
+    def _write(self, snapshot: Dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f: json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def _acquire_file_lock(self) -> bool:
+        try:
+            if time.time() - os.path.getmtime(self.lock_path) > GOOGLE_FONTS_LOCK_STALE_AFTER: os.remove(self.lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def is_stale(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is None or time.time() - snapshot.get('checked_at', 0) > self.refresh_interval
+
+    def is_loaded(self) -> bool:
+        return bool(self._families)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Fetches the catalog if it changed upstream. Returns False if the refresh could not run or failed."""
+        if not (api_key := os.getenv('GOOGLE_FONTS_API_KEY')):
+            print("Warning: GOOGLE_FONTS_API_KEY not set.")
+            return False
+        if not self._acquire_file_lock(): return False
+        try:
+            self._load()  # another worker may have refreshed it while we waited
+            if not force and not self.is_stale(): return True
+            previous = self._snapshot or {}
+            headers = {}
+            if previous.get('etag'): headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'): headers['If-Modified-Since'] = previous['last_modified']
+            print("Refreshing Google Fonts catalog...")
+            response = OUTBOUND_HTTP.get(GOOGLE_FONTS_API_URL, params={'key': api_key, 'sort': 'popularity'}, headers=headers, timeout=10)
+            if response.status_code == 304 and previous.get('fonts'):
+                snapshot = dict(previous, checked_at=time.time())
+            else:
+                response.raise_for_status()
+                items = response.json().get('items') or []
+                if not items: raise ValueError("the API returned an empty catalog")
+                snapshot = {
+                    'fetched_at': time.time(), 'checked_at': time.time(),
+                    'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                    'fonts': [{'family': item['family'], 'category': item.get('category'), 'variants': item.get('variants', []), 'rank': rank}
+                              for rank, item in enumerate(items, 1)],
+                }
+                print(f"Loaded {len(snapshot['fonts'])} fonts from Google API.")
+            self._write(snapshot)
+            self._load()
+            return True
+        except (requests.RequestException, ValueError, KeyError, OSError) as e:
+            print(f"Error refreshing Google Fonts catalog (keeping the last snapshot): {e}")
+            return False
+        finally:
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def _refresh_in_background(self) -> None:
+        try:
+            # A lock held elsewhere is not a failure: that process is refreshing and this one will load its snapshot.
+            if not self.refresh() and not os.path.exists(self.lock_path): self._retry_after = time.time() + self.retry_interval
+        finally:
+            self._refreshing = False
+
+    def _wait_for_first_snapshot(self, timeout: float) -> None:
+        """Waits while another thread or process holds the refresh, until its snapshot can be loaded."""
+        deadline = time.monotonic() + timeout
+        while self._snapshot is None and (self._refreshing or os.path.exists(self.lock_path)) and time.monotonic() < deadline:
+            time.sleep(0.2)
+            self._load()
+
+    def ensure_fresh(self) -> None:
+        """Loads the snapshot and, if it is stale, starts a refresh. Blocks only when there is no snapshot at all."""
+        self._load()
+        if self.is_stale() and not self._refreshing and time.time() >= self._retry_after:
+            with self._lock:
+                start, self._refreshing = not self._refreshing, True
+            if start and self._snapshot is None:
+                self._refresh_in_background()
+            elif start:
+                threading.Thread(target=self._refresh_in_background, name='google-fonts-refresh', daemon=True).start()
+        if self._snapshot is None: self._wait_for_first_snapshot(GOOGLE_FONTS_FIRST_LOAD_WAIT)
+
+    def snapshot(self) -> Dict[str, Any]:
+        self.ensure_fresh()
+        return self._snapshot or {'fonts': []}
+
+    def families(self) -> Dict[str, str]:
+        self.ensure_fresh()
+        return self._families
+
+GOOGLE_FONTS_CATALOG = GoogleFontsCatalog(GOOGLE_FONTS_CATALOG_PATH, GOOGLE_FONTS_REFRESH_INTERVAL, GOOGLE_FONTS_RETRY_INTERVAL)
 
 def load_google_fonts_from_api() -> Dict[str, str]:
-    global GOOGLE_FONTS_API_CACHE
-    if GOOGLE_FONTS_API_CACHE is not None: return GOOGLE_FONTS_API_CACHE
-    print("Loading Google Fonts from API...")
-    api_key = os.getenv('GOOGLE_FONTS_API_KEY')
-    if not api_key:
-        print("Warning: GOOGLE_FONTS_API_KEY not set.")
-        GOOGLE_FONTS_API_CACHE = {}
-        return {}
-    api_url = f"https://www.googleapis.com/webfonts/v1/webfonts?key={api_key}&sort=popularity"
-    try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        font_map = {item['family'].lower(): item['family'] for item in data.get('items', [])}
-        print(f"Loaded {len(font_map)} fonts from Google API.")
-        GOOGLE_FONTS_API_CACHE = font_map
-        return font_map
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching Google Fonts: {e}")
-        GOOGLE_FONTS_API_CACHE = {}
-        return {}
+    """Lowercase family name -> family name, from the shared on-disk catalog."""
+    return GOOGLE_FONTS_CATALOG.families()
+
+@app.cli.command("refresh-google-fonts")
+def refresh_google_fonts_command():
+    """Fetch the Google Fonts catalog into the shared snapshot now, e.g. at deploy time."""
+    ok = GOOGLE_FONTS_CATALOG.refresh(force=True)
+    click.echo(f"{'Refreshed' if ok else 'Could not refresh'}: {len(GOOGLE_FONTS_CATALOG.snapshot().get('fonts', []))} fonts in {GOOGLE_FONTS_CATALOG.path}")
+# --- END: GOOGLE FONTS CATALOG ---
 
 def get_largest_from_srcset(srcset: Optional[str]) -> Optional[str]:
     if not srcset: return None
@@ -459,222 +828,1298 @@ def get_largest_from_srcset(srcset: Optional[str]) -> Optional[str]:
             sources.append((width, url))
     return max(sources, key=lambda x: x[0])[1] if sources else None
 
-def extract_all_images_from_html(soup: BeautifulSoup, base_url: str) -> Set[str]:
-    image_urls: Set[str] = set()
-    for img in soup.find_all('img'):
-        src_to_use: Optional[str] = None
-        if isinstance(parent := img.find_parent('picture'), Tag):
-            for source in parent.find_all('source'):
-                if isinstance(source, Tag) and (srcset_attr := source.get('srcset')) and isinstance(srcset_attr, str):
-                    if src_to_use := get_largest_from_srcset(srcset_attr): break
-        if not src_to_use:
-            srcset_val = img.get('data-srcset') or img.get('srcset')
-            src_val = img.get('data-src') or img.get('src')
-            src_to_use = get_largest_from_srcset(srcset_val) if isinstance(srcset_val, str) else src_val
-        if isinstance(src_to_use, str) and not src_to_use.startswith(('data:image', 'about:blank')):
-            if len(full_url := urljoin(base_url, src_to_use)) < 2048: image_urls.add(full_url)
-    return image_urls
+STYLESHEET_FETCH_WORKERS: int = int(os.environ.get('STYLESHEET_FETCH_WORKERS', 8))
+STYLESHEET_PHASE_BUDGET: float = float(os.environ.get('STYLESHEET_PHASE_BUDGET', 15))
+STYLESHEET_MAX_IMPORT_DEPTH: int = 4
+STYLESHEET_MAX_COUNT: int = 60
+CSS_URL_PATTERN = re.compile(r'url\((.*?)\)')
+CSS_IMPORT_PATTERN = re.compile(r'@import\s+(?:url\(\s*)?[\'"]?([^\'")\s;]+)[\'"]?\s*\)?[^;]*;?', re.IGNORECASE)
+
+STYLESHEET_MAX_BYTES: int = 2 * 1024 * 1024
+
+def _fetch_stylesheet(css_url: str, timeout: float) -> Optional[str]:
+    try:
+        css_response = OUTBOUND_HTTP.get(css_url, timeout=timeout, max_bytes=STYLESHEET_MAX_BYTES)
+        css_response.raise_for_status()
+        return css_response.text
+    except requests.RequestException as e:
+        print(f"Could not fetch or parse CSS file: {css_url}. Reason: {e}")
+        return None
+
+def fetch_stylesheets(css_urls: List[str], time_budget: float = STYLESHEET_PHASE_BUDGET, on_budget_exhausted: Optional[Callable[[int], None]] = None,
+                      prefetched: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+    """Fetches stylesheets concurrently, following @import chains, within one overall time budget.
+
+    Returns (url, css_text) pairs for every sheet that arrived before the deadline. Each URL is
+    fetched at most once, which also breaks @import cycles. Sheets found in `prefetched` (url -> css)
+    are reused instead of fetched. If the budget runs out first, on_budget_exhausted is called with
+    the number of sheets still loading.
+    """
+    deadline = time.monotonic() + time_budget
+    seen: Set[str] = set()
+    pending: Dict[Future, Tuple[str, int]] = {}
+    results: List[Tuple[str, str]] = []
+    executor = ThreadPoolExecutor(max_workers=STYLESHEET_FETCH_WORKERS, thread_name_prefix='stylesheet-fetch')
+
+    def schedule(css_url: str, depth: int) -> None:
+        css_url = css_url.split('#')[0]
+        if css_url in seen or len(seen) >= STYLESHEET_MAX_COUNT or not css_url.startswith(('http://', 'https://')): return
+        seen.add(css_url)
+        if prefetched and (css_text := prefetched.get(css_url)) is not None:
+            results.append((css_url, css_text))
+            if depth < STYLESHEET_MAX_IMPORT_DEPTH:
+                for imported in CSS_IMPORT_PATTERN.findall(css_text): schedule(urljoin(css_url, imported), depth + 1)
+            return
+        pending[executor.submit(_fetch_stylesheet, css_url, max(1.0, min(10.0, deadline - time.monotonic())))] = (css_url, depth)
+
+    try:
+        for css_url in css_urls: schedule(css_url, 0)
+        while pending and (remaining := deadline - time.monotonic()) > 0:
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                css_url, depth = pending.pop(future)
+                if (css_text := future.result()) is None: continue
+                results.append((css_url, css_text))
+                if depth < STYLESHEET_MAX_IMPORT_DEPTH:
+                    for imported in CSS_IMPORT_PATTERN.findall(css_text): schedule(urljoin(css_url, imported), depth + 1)
+        if pending:
+            print(f"Stylesheet budget of {time_budget}s exhausted with {len(pending)} sheets still loading.")
+            if on_budget_exhausted: on_budget_exhausted(len(pending))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
 
-def extract_css_background_images(soup: BeautifulSoup, base_url: str) -> Set[str]:
+def extract_stylesheet_image_urls(stylesheets: List[Tuple[str, str]]) -> Set[str]:
     image_urls: Set[str] = set()
-    for element in soup.select('[style*="background-image"]'):
-        if isinstance(style := element.get('style'), str) and (match := re.search(r'url\((.*?)\)', style)):
-            if (url := match.group(1).strip("'\"")) and not url.startswith('data:image'):
-                if len(full_url := urljoin(base_url, url)) < 2048:
+    for css_url, css_text in stylesheets:
+        for url in CSS_URL_PATTERN.findall(CSS_IMPORT_PATTERN.sub('', css_text)):
+            clean_url = url.strip("'\"")
+            if not clean_url.startswith(('data:image', '#')):
+                full_url = urljoin(css_url, clean_url)
+                if len(full_url) < 2048:
                     image_urls.add(full_url)
-    for link in soup.find_all('link', rel='stylesheet', href=True):
-        if isinstance(href := link.get('href'), str):
-            css_url = urljoin(base_url, href)
-            try:
-                css_response = requests.get(css_url, timeout=10)
-                css_response.raise_for_status()
-                urls_in_css = re.findall(r'url\((.*?)\)', css_response.text)
-                for url in urls_in_css:
-                    clean_url = url.strip("'\"")
-                    if not clean_url.startswith(('data:image', '#')):
-                        full_url = urljoin(css_url, clean_url)
-                        if len(full_url) < 2048:
-                            image_urls.add(full_url)
-            except requests.RequestException as e:
-                print(f"Could not fetch or parse CSS file: {css_url}. Reason: {e}")
-                continue
     return image_urls
 
-def extract_fonts_from_google_links(soup: BeautifulSoup) -> List[str]:
-    found_fonts: Set[str] = set()
-    for link in soup.find_all('link', href=True):
-        if isinstance(link, Tag) and isinstance(href := link.get('href'), str) and 'fonts.googleapis.com/css' in href:
-            if 'family' in (query_params := parse_qs(urlparse(href).query)):
+# --- START: SINGLE-PASS HTML ASSET SCANNER ---
+class _AssetScanTarget:
+    """lxml parser target that collects every asset the extractor needs while the C parser streams the document.
+
+    It mirrors the BeautifulSoup helpers it replaced, which bench/legacy_html.py keeps for comparison.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.images: Set[str] = set()
+        self.inline_backgrounds: Set[str] = set()
+        self.stylesheets: List[str] = []
+        self.links: Set[str] = set()
+        self.google_fonts: Set[str] = set()
+        self.has_typekit = False
+        self.style_blocks: List[str] = []
+        self.inline_font_styles: List[str] = []
+        self.has_body = False
+        self.body_text_chars = 0
+        self.spa_roots: Dict[str, bool] = {}
+        self._pictures: List[Dict[str, Any]] = []
+        self._open_roots: List[Dict[str, Any]] = []
+        self._depth = 0
+        self._skip_text_depth: Optional[int] = None
+        self._in_style = False
+
+    def _add_image(self, attrib: Dict[str, str], picture_source: Optional[str]) -> None:
+        src_to_use = picture_source
+        if not src_to_use:
+            srcset_val = attrib.get('data-srcset') or attrib.get('srcset')
+            src_val = attrib.get('data-src') or attrib.get('src')
+            src_to_use = get_largest_from_srcset(srcset_val) if isinstance(srcset_val, str) else src_val
+        if isinstance(src_to_use, str) and not src_to_use.startswith(('data:image', 'about:blank')):
+            if len(full_url := urljoin(self.base_url, src_to_use)) < 2048: self.images.add(full_url)
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        self._depth += 1
+        if tag == 'body': self.has_body = True
+        if tag in ('script', 'style', 'template', 'noscript') and self._skip_text_depth is None: self._skip_text_depth = self._depth
+        if (root_id := attrib.get('id')) in SPA_ROOT_IDS and root_id not in self.spa_roots and self.has_body:
+            self.spa_roots[root_id] = False
+            self._open_roots.append({'id': root_id, 'depth': self._depth, 'content': 0})
+        if tag in ('img', 'picture'):
+            for root in self._open_roots: root['content'] += 1
+        if tag == 'img':
+            if self._pictures: self._pictures[-1]['imgs'].append(dict(attrib))
+            else: self._add_image(attrib, None)
+        elif tag == 'picture':
+            self._pictures.append({'source': None, 'imgs': []})
+        elif tag == 'source' and self._pictures and (srcset := attrib.get('srcset')):
+            # find_all('source') on a <picture> sees nested pictures too, so every open frame is a candidate.
+            if largest := get_largest_from_srcset(srcset):
+                for frame in self._pictures:
+                    if frame['source'] is None: frame['source'] = largest
+        elif tag == 'link' and (href := attrib.get('href')) is not None:
+            if 'stylesheet' in attrib.get('rel', '').lower().split():
+                self.stylesheets.append(urljoin(self.base_url, href))
+            if 'fonts.googleapis.com/css' in href and 'family' in (query_params := parse_qs(urlparse(href).query)):
                 for family_str in query_params['family']:
                     for font_name in family_str.split('|'):
-                        found_fonts.add(font_name.split(':')[0].replace('+', ' ').strip())
-    return list(found_fonts)
-
-def detect_adobe_fonts_usage(soup: BeautifulSoup) -> bool:
-    for el_type in ['link', 'script']:
-        for el in soup.find_all(el_type, href=True):
-            if isinstance(href := el.get('href'), str) and 'use.typekit.net' in href:
-                print("Adobe Fonts loader detected."); return True
-    print("Adobe Fonts loader not found."); return False
+                        self.google_fonts.add(font_name.split(':')[0].replace('+', ' ').strip())
+        elif tag == 'a' and (href := attrib.get('href')) and not href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
+            self.links.add(urljoin(self.base_url, href).split('#')[0])
+        elif tag == 'style':
+            self._in_style = True
+            self.style_blocks.append('')
+        if tag in ('link', 'script') and 'use.typekit.net' in attrib.get('href', ''):
+            self.has_typekit = True
+        if (style := attrib.get('style')) is not None:
+            if 'background-image' in style and (match := CSS_URL_PATTERN.search(style)):
+                if (url := match.group(1).strip("'\"")) and not url.startswith('data:image'):
+                    if len(full_url := urljoin(self.base_url, url)) < 2048: self.inline_backgrounds.add(full_url)
+            if 'font-family' in style: self.inline_font_styles.append(style)
+
+    def end(self, tag: str) -> None:
+        if self._open_roots and self._open_roots[-1]['depth'] == self._depth:
+            root = self._open_roots.pop()
+            self.spa_roots[root['id']] = root['content'] == 0
+        if self._skip_text_depth == self._depth: self._skip_text_depth = None
+        self._depth -= 1
+        if tag == 'picture' and self._pictures:
+            frame = self._pictures.pop()
+            for attrib in frame['imgs']: self._add_image(attrib, frame['source'])
+        elif tag == 'style':
+            self._in_style = False
+
+    def data(self, text: str) -> None:
+        if self._in_style: self.style_blocks[-1] += text
+        if self._skip_text_depth is None and self.has_body and (length := len(text.strip())):
+            self.body_text_chars += length + 1
+            for root in self._open_roots: root['content'] += length
+
+    def close(self) -> Dict[str, Any]:
+        while self._pictures:
+            frame = self._pictures.pop()
+            for attrib in frame['imgs']: self._add_image(attrib, frame['source'])
+        return {
+            'images': self.images, 'inline_backgrounds': self.inline_backgrounds, 'stylesheets': self.stylesheets, 'links': self.links,
+            'google_fonts': sorted(self.google_fonts), 'has_typekit': self.has_typekit,
+            'style_blocks': self.style_blocks, 'inline_font_styles': self.inline_font_styles,
+            'has_body': self.has_body, 'body_text_chars': self.body_text_chars,
+            'empty_spa_root': next((root_id for root_id, empty in self.spa_roots.items() if empty), None),
+        }
+
+def scan_html_assets(html: str, base_url: str) -> Dict[str, Any]:
+    """Collects images, inline backgrounds, stylesheet and anchor links, Google Fonts families and Typekit loaders in one pass."""
+    target = _AssetScanTarget(base_url)
+    parser = etree.HTMLParser(target=target, recover=True, encoding='utf-8')
+    try:
+        return etree.fromstring(html.encode('utf-8', errors='replace'), parser)
+    except etree.LxmlError:
+        return target.close()
+# --- END: SINGLE-PASS HTML ASSET SCANNER ---
+
+# --- START: FONT CLASSIFICATION ---
+FONT_GENERIC_FALLBACKS: frozenset = frozenset({'sans-serif', 'serif', 'monospace', 'cursive', 'fantasy', 'system-ui', 'ui-sans-serif', 'ui-serif', 'apple-system', 'blinkmacsystemfont'})
+FONT_SKIP_PATTERN = re.compile(r'emoji|symbol', re.IGNORECASE)
+FONT_GARBAGE_PATTERN = re.compile(r'^(wf_|webfont-|var--|mktype-)|([a-f0-9]{8,})')
+FONT_PREFIX_PATTERN = re.compile(r'^(orig|original)[_\-\s]', re.IGNORECASE)
+_FONT_STYLE_WORDS = r'regular|italic|bold|medium|light|black|heavy|thin|condensed|expanded|oblique|book|roman|pro|std|w[0-9]{1,2}|[1-9]00|demi|semi|extra|cf'
+# A whole run of style words ("SemiBoldItalic") in one match, so stripping needs a single pass.
+FONT_SUFFIX_RUN_PATTERN = re.compile(rf'(?:[_\-\s]?(?:{_FONT_STYLE_WORDS}))+\b', re.IGNORECASE)
+FONT_SEPARATOR_PATTERN = re.compile(r'[\s_-]+')
+FONT_ICON_PATTERN = re.compile('|'.join(sorted(map(re.escape, ICON_FONT_TERMS))))
+# What may follow a known family for a name to still be that family: "Inter Var", "Roboto Flex Variable", "LatoWeb".
+FONT_FUZZY_REMAINDER_PATTERN = re.compile(r'(?:var|variable|vf|web|webfont|font|[0-9]+)+')
+
+@lru_cache(maxsize=4096)
+def split_font_stack(font_stack: str) -> Tuple[str, ...]:
+    """The named families in a CSS font-family stack, without generic fallbacks or emoji/symbol fonts."""
+    names = (f.strip("'\" ") for f in font_stack.split(','))
+    return tuple(n for n in names if n and n.lower() not in FONT_GENERIC_FALLBACKS and not FONT_SKIP_PATTERN.search(n))
+
+@lru_cache(maxsize=8192)
+def font_name_key(name: str) -> str:
+    """Canonical key for a family name: no build prefixes or style suffixes, lowercase, no separators.
+
+    Returns '' for machine-generated names (hashes, webfont loader prefixes).
+    """
+    if FONT_GARBAGE_PATTERN.search(name.lower()): return ''
+    base = FONT_SUFFIX_RUN_PATTERN.sub('', FONT_PREFIX_PATTERN.sub('', name)).strip()
+    return FONT_SEPARATOR_PATTERN.sub('', base.lower())
+
+@lru_cache(maxsize=4096)
+def font_search_name(display_name: str) -> str:
+    return FONT_SEPARATOR_PATTERN.sub(' ', FONT_PREFIX_PATTERN.sub('', FONT_SUFFIX_RUN_PATTERN.sub('', display_name).strip())).strip()
+
+class FontClassifier:
+    """Resolves canonical font keys against the system, Google and MyFonts name sets.
+
+    Every set is indexed under the same canonical key as the names being looked up. A character trie
+    over those keys resolves names a known family merely prefixes when what follows is a variable/web
+    build marker, so "Inter Var" and "Roboto Flex Variable" land on Inter and Roboto Flex.
+    """
+
+    _END = ''
+
+    def __init__(self, google_families: Dict[str, str]):
+        self.index: Dict[str, Tuple[str, str]] = {}
+        # Later sources never override earlier ones: system beats Google beats MyFonts.
+        for source, names in (('system', {n: n for n in SYSTEM_FONTS}), ('google', google_families), ('myfonts_direct', {n: n for n in MYFONTS_KNOWN_LIST})):
+            for name, canonical in names.items():
+                if (key := font_name_key(name)) and key not in self.index: self.index[key] = (source, canonical)
+        self.trie: Dict[str, Any] = {}
+        for key in self.index:
+            node = self.trie
+            for char in key: node = node.setdefault(char, {})
+            node[self._END] = key
+
+    def resolve(self, key: str) -> str:
+        """The indexed key a canonical key stands for, exactly or through the longest fuzzily matching prefix.
+
+        Keys that match nothing are returned unchanged.
+        """
+        if key in self.index: return key
+        node, best = self.trie, key
+        for i, char in enumerate(key):
+            if (node := node.get(char)) is None: break
+            if self._END in node and FONT_FUZZY_REMAINDER_PATTERN.fullmatch(key, i + 1): best = node[self._END]
+        return best
+
+    def lookup(self, key: str) -> Optional[Tuple[str, str]]:
+        """(source, canonical family) for a key, or None if it resolves to no known family."""
+        return self.index.get(self.resolve(key))
+
+    def classify(self, key: str, is_adobe_site: bool) -> Tuple[str, Optional[str]]:
+        """(type, Google family name or None) for a canonical key."""
+        match = self.lookup(key)
+        if match and match[0] == 'system': return 'system', None
+        if FONT_ICON_PATTERN.search(key): return 'icon', None
+        if match: return match[0], match[1] if match[0] == 'google' else None
+        return ('adobe' if is_adobe_site else 'myfonts_search'), None
+
+_FONT_CLASSIFIER: Optional[Tuple[Dict[str, str], FontClassifier]] = None
+
+def get_font_classifier() -> FontClassifier:
+    """The classifier for the current Google Fonts snapshot, rebuilt only when the snapshot changes."""
+    global _FONT_CLASSIFIER
+    google_families = load_google_fonts_from_api()
+    if _FONT_CLASSIFIER is None or _FONT_CLASSIFIER[0] is not google_families:
+        _FONT_CLASSIFIER = (google_families, FontClassifier(google_families))
+    return _FONT_CLASSIFIER[1]
 
 def process_fonts(computed_fonts: List[str], google_link_fonts: List[str], is_adobe_site: bool) -> List[Dict[str, str]]:
-    raw_font_names: Set[str] = set(google_link_fonts)
-    generic_fallbacks: Set[str] = {'sans-serif', 'serif', 'monospace', 'cursive', 'fantasy', 'system-ui', 'ui-sans-serif', 'ui-serif', 'apple-system', 'blinkmacsystemfont'}
-    for font_stack in computed_fonts:
-        for font in [f.strip("'\" ") for f in font_stack.split(',')]:
-            if font and font.lower() not in generic_fallbacks and not any(term in font.lower() for term in ['emoji', 'symbol']):
-                raw_font_names.add(font)
-    garbage_pattern = re.compile(r'^(wf_|webfont-|var--|mktype-)|([a-f0-9]{8,})')
-    human_readable_names = {name for name in raw_font_names if not garbage_pattern.search(name.lower())}
+    classifier = get_font_classifier()
+    # Keyed by the resolved family so "Inter var" and "Inter", or "LatoWeb" and "Lato", merge into one entry.
     font_map: Dict[str, str] = {}
-    suffix_pattern = re.compile(r'[_\-\s]?(regular|italic|bold|medium|light|black|heavy|thin|condensed|expanded|oblique|book|roman|pro|std|w[0-9]{1,2}|[1-9]00|demi|semi|extra|cf)\b', re.IGNORECASE)
-    prefix_pattern = re.compile(r'^(orig|original)[_\-\s]', re.IGNORECASE)
-    for name in human_readable_names:
-        base_name_for_key = prefix_pattern.sub('', name)
-        temp_name = ""
-        while temp_name != base_name_for_key:
-            temp_name = base_name_for_key
-            base_name_for_key = suffix_pattern.sub('', temp_name).strip()
-        key = re.sub(r'[\s_-]', '', base_name_for_key.lower())
-        if not key: continue
-        if key not in font_map or len(name) < len(font_map[key]):
-            font_map[key] = name
-    google_fonts_map = load_google_fonts_from_api()
+    for names in [google_link_fonts, *map(split_font_stack, computed_fonts)]:
+        for name in names:
+            if not (key := font_name_key(name)): continue
+            key = classifier.resolve(key)
+            if key not in font_map or len(name) < len(font_map[key]):
+                font_map[key] = name
     final_results = []
     for classification_key, display_name in font_map.items():
-        font_type = None
-        if classification_key in SYSTEM_FONTS_CANONICAL:
-            font_type = 'system'
-        else:
-            if any(term in classification_key for term in ICON_FONT_TERMS): font_type = 'icon'
-            elif classification_key in google_fonts_map: font_type = 'google'
-            elif classification_key in MYFONTS_KNOWN_LIST: font_type = 'myfonts_direct'
-            elif is_adobe_site: font_type = 'adobe'
-            else: font_type = 'myfonts_search'
+        font_type, google_name = classifier.classify(classification_key, is_adobe_site)
         if font_type != 'icon':
-            search_base_1 = suffix_pattern.sub('', display_name).strip()
-            search_base_2 = prefix_pattern.sub('', search_base_1).strip()
-            human_search_name = re.sub(r'[_\-]+', ' ', search_base_2).strip()
-            result = {'displayName': display_name, 'searchName': human_search_name, 'type': font_type}
+            result = {'displayName': display_name, 'searchName': font_search_name(display_name), 'type': font_type}
             if font_type == 'google':
-                result['urlName'] = google_fonts_map.get(classification_key, display_name)
+                result['urlName'] = google_name or display_name
             final_results.append(result)
     return final_results
-
-def get_clustered_color_palette(color_data: Dict[str, float], threshold: float = 45.0) -> Dict[str, List[str]]:
-    hex_scores: Dict[str, float] = {}
+# --- END: FONT CLASSIFICATION ---
+
+# --- START: PERCEPTUAL COLOUR CLUSTERING ---
+PALETTE_DELTA_E: float = 12.0
+CSS_RGB_PATTERN = re.compile(r'\s*rgba?\(\s*([\d.]+)[,\s]+([\d.]+)[,\s]+([\d.]+)(?:\s*[,/]\s*([\d.]+)(%?))?', re.IGNORECASE)
+CSS_HEX_PATTERN = re.compile(r'#([0-9a-f]{6}|[0-9a-f]{3})\b', re.IGNORECASE)
+# sRGB (D65) -> XYZ, with the D65 white point folded in so XYZ comes out already normalised.
+_SRGB_TO_XYZ_D65 = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+]) / np.array([[0.95047], [1.0], [1.08883]])
+
+def parse_css_colors(color_data: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Parses computed colour strings into packed 0xRRGGBB codes and their scores, dropping mostly transparent ones."""
+    codes: List[int] = []
+    scores: List[float] = []
     for color_str, score in color_data.items():
-        try:
-            if 'rgba' in color_str and (rgba := re.findall(r'[\d.]+', color_str)) and len(rgba) == 4 and float(rgba[3]) < 0.5: continue
-            if (rgb_values := re.findall(r'\d+', color_str)) and len(rgb_values) >= 3:
-                rgb: Tuple[int, int, int] = (int(rgb_values[0]), int(rgb_values[1]), int(rgb_values[2]))
-                hex_color = webcolors.rgb_to_hex(rgb).upper()
-                hex_scores[hex_color] = hex_scores.get(hex_color, 0) + score
-        except (ValueError, IndexError): continue
-    if not hex_scores: return {}
-    sorted_colors = sorted(hex_scores.items(), key=lambda item: item[1], reverse=True)
-    merged_colors: List[Dict[str, Any]] = []
-    for hex_color, score in sorted_colors:
-        rgb_color = tuple(int(hex_color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
-        found_cluster = False
-        for cluster in merged_colors:
-            cluster_rgb = tuple(int(cluster['hex'].lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
-            if sum((c1 - c2) ** 2 for c1, c2 in zip(rgb_color, cluster_rgb)) ** 0.5 < threshold:
-                cluster['score'] += score; found_cluster = True; break
-        if not found_cluster: merged_colors.append({'hex': hex_color, 'score': score})
-    final_sorted = sorted(merged_colors, key=lambda item: item['score'], reverse=True)
+        if match := CSS_RGB_PATTERN.match(color_str):
+            r, g, b, alpha, percent = match.groups()
+            if alpha is not None and float(alpha) / (100 if percent else 1) < 0.5: continue
+            try:
+                rgb = [min(255, int(float(v))) for v in (r, g, b)]
+            except ValueError:
+                continue
+        elif match := CSS_HEX_PATTERN.search(color_str):
+            digits = match.group(1) if len(match.group(1)) == 6 else ''.join(c * 2 for c in match.group(1))
+            rgb = [int(digits[i:i + 2], 16) for i in (0, 2, 4)]
+        else:
+            continue
+        codes.append((rgb[0] << 16) | (rgb[1] << 8) | rgb[2])
+        scores.append(float(score))
+    return np.array(codes, dtype=np.int64), np.array(scores, dtype=np.float64)
+
+def srgb_codes_to_lab(codes: np.ndarray) -> np.ndarray:
+    """Converts packed 0xRRGGBB codes to CIELAB (D65), vectorised over the whole array."""
+    rgb = np.stack([(codes >> 16) & 0xFF, (codes >> 8) & 0xFF, codes & 0xFF], axis=1) / 255.0
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _SRGB_TO_XYZ_D65.T
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+def get_clustered_color_palette(color_data: Dict[str, float], threshold: float = PALETTE_DELTA_E) -> Dict[str, List[str]]:
+    """Groups colours that are within ``threshold`` (CIE76 delta E) of each other, weighted by painted area.
+
+    Colours are visited from highest to lowest score and each one joins the first, highest-scoring
+    cluster whose leading colour is close enough, otherwise it starts a new cluster. Each sweep below
+    peels off one whole cluster with a single vectorised distance computation.
+    """
+    codes, scores = parse_css_colors(color_data)
+    if not codes.size: return {}
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    unique_scores = np.bincount(inverse, weights=scores)
+    # Highest score first; ties broken by colour value so the palette is deterministic.
+    order = np.lexsort((unique_codes, -unique_scores))
+    unique_codes, unique_scores = unique_codes[order], unique_scores[order]
+    lab = srgb_codes_to_lab(unique_codes)
+
+    leaders: List[int] = []
+    cluster_scores: List[float] = []
+    threshold_sq = threshold ** 2
+    while unique_codes.size:
+        diff = lab - lab[0]
+        close = np.einsum('ij,ij->i', diff, diff) < threshold_sq
+        leaders.append(int(unique_codes[0]))
+        cluster_scores.append(float(unique_scores[close].sum()))
+        keep = ~close
+        lab, unique_codes, unique_scores = lab[keep], unique_codes[keep], unique_scores[keep]
+
+    final_sorted = [f"#{leaders[i]:06X}" for i in sorted(range(len(leaders)), key=lambda i: -cluster_scores[i])]
     color_groups: Dict[str, List[str]] = {}
-    if primary := [c['hex'] for c in final_sorted[:8]]: color_groups["Primary Palette"] = primary
-    if secondary := [c['hex'] for c in final_sorted[8:24]]: color_groups["Secondary Colors"] = secondary
+    if primary := final_sorted[:8]: color_groups["Primary Palette"] = primary
+    if secondary := final_sorted[8:24]: color_groups["Secondary Colors"] = secondary
     return color_groups
+# --- END: PERCEPTUAL COLOUR CLUSTERING ---
+
+# --- START: HEADLESS BROWSER POOL ---
+BROWSER_POOL_SIZE: int = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_PAGES_PER_INSTANCE: int = int(os.environ.get('BROWSER_MAX_PAGES_PER_INSTANCE', 50))
+BROWSER_MAX_RSS_MB: int = int(os.environ.get('BROWSER_MAX_RSS_MB', 1024))
+# How long past its time budget a scan may hold the caller before its coroutine is cancelled.
+BROWSER_RUN_GRACE_SECONDS: float = 15.0
+BROWSER_CONTEXT_CLOSE_TIMEOUT: float = 10.0
+BROWSER_LAUNCH_ARGS: List[str] = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+
+class _PooledBrowser:
+    def __init__(self, browser: Any):
+        self.browser = browser
+        self.pages_served = 0
+        self.broken = False
+
+    def rss_mb(self) -> float:
+        process = self.browser.process
+        if process is None: return 0.0
+        try:
+            root = psutil.Process(process.pid)
+            return sum(p.memory_info().rss for p in [root] + root.children(recursive=True)) / (1024 * 1024)
+        except psutil.Error:
+            return 0.0
+
+class BrowserPool:
+    """A bounded set of long-lived Chromium instances shared by all scans in this worker.
+
+    pyppeteer objects are tied to the event loop that created them, so the pool owns a
+    dedicated loop running in a daemon thread and scans are submitted to it with ``run()``.
+    Each scan gets its own incognito context, which is thrown away afterwards.
+    """
+
+    def __init__(self, size: int, max_pages: int, max_rss_mb: int):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots: List[_PooledBrowser] = []
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # Gunicorn forks after import, so the loop thread is started lazily per process.
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='browser-pool', daemon=True).start()
+                self._loop, self._pid, self._idle, self._slots = loop, os.getpid(), None, []
+            return self._loop
+
+    def run(self, coro: Any, timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the pool's event loop and blocks until it finishes.
+
+        If the wait times out (or the calling thread is interrupted) the coroutine is cancelled, so it
+        does not keep its page and browser slot after nobody is waiting for it.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def _get_idle(self) -> asyncio.Queue:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size): self._idle.put_nowait(None)
+        return self._idle
+
+    async def _launch(self) -> _PooledBrowser:
+        print("Launching pooled Chromium instance...")
+        # Signal handlers can only be installed from the main thread, and the pool loop is not it.
+        browser = await launch(headless=True, args=BROWSER_LAUNCH_ARGS, handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False)
+        slot = _PooledBrowser(browser)
+        self._slots.append(slot)
+        return slot
+
+    async def _retire(self, slot: _PooledBrowser, reason: str) -> None:
+        print(f"Retiring pooled Chromium instance ({reason}) after {slot.pages_served} pages.")
+        if slot in self._slots: self._slots.remove(slot)
+        try:
+            await asyncio.wait_for(slot.browser.close(), 10)
+        except Exception as e:
+            print(f"Could not close Chromium cleanly: {e}")
+            if slot.browser.process is not None: slot.browser.process.kill()
 
-async def extract_assets_from_page_async(url: str, options: Dict[str, Any]) -> Tuple[Set[str], List[Dict[str, str]], Dict[str, float]]:
-    print(f"Analyzing page using Enhanced Hybrid Method: {url}")
-    browser = None
+    async def _is_healthy(self, slot: _PooledBrowser) -> bool:
+        if slot.broken or (slot.browser.process is not None and slot.browser.process.poll() is not None):
+            return False
+        try:
+            await asyncio.wait_for(slot.browser.version(), 5)
+            return True
+        except Exception:
+            return False
+
+    async def _acquire(self) -> _PooledBrowser:
+        slot = await self._get_idle().get()
+        try:
+            if slot is not None:
+                if slot.pages_served >= self.max_pages:
+                    await self._retire(slot, 'page limit'); slot = None
+                elif slot.rss_mb() > self.max_rss_mb:
+                    await self._retire(slot, 'memory limit'); slot = None
+                elif not await self._is_healthy(slot):
+                    await self._retire(slot, 'health check failed'); slot = None
+            return slot or await self._launch()
+        except BaseException:
+            self._get_idle().put_nowait(None)
+            raise
+
+    @asynccontextmanager
+    async def page(self, acquire_timeout: Optional[float] = None):
+        """Yields a fresh page in an isolated incognito context on a pooled browser.
+
+        Waiting for a free browser (and launching one) raises asyncio.TimeoutError after acquire_timeout.
+        The page and its context are closed and the browser goes back to the pool however the scan
+        ends, including when it is cancelled.
+        """
+        slot = await asyncio.wait_for(self._acquire(), acquire_timeout)
+        context = page = None
+        try:
+            context = await slot.browser.createIncognitoBrowserContext()
+            page = await context.newPage()
+            yield page
+        except Exception:
+            if not await self._is_healthy(slot): slot.broken = True
+            raise
+        finally:
+            slot.pages_served += 1
+            try:
+                if page is not None and not page.isClosed(): await asyncio.wait_for(page.close(), BROWSER_CONTEXT_CLOSE_TIMEOUT)
+                if context is not None: await asyncio.wait_for(context.close(), BROWSER_CONTEXT_CLOSE_TIMEOUT)
+            except BaseException:
+                # A page or context that will not close leaves the browser in an unknown state.
+                slot.broken = True
+            self._get_idle().put_nowait(slot)
+
+    async def _close_all(self) -> None:
+        for slot in list(self._slots):
+            await self._retire(slot, 'shutdown')
+
+    def shutdown(self) -> None:
+        if self._loop is None or self._pid != os.getpid(): return
+        try:
+            self.run(self._close_all(), timeout=15)
+        except Exception as e:
+            print(f"Browser pool shutdown failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+BROWSER_POOL = BrowserPool(BROWSER_POOL_SIZE, BROWSER_MAX_PAGES_PER_INSTANCE, BROWSER_MAX_RSS_MB)
+atexit.register(BROWSER_POOL.shutdown)
+# --- END: HEADLESS BROWSER POOL ---
+
+# --- START: RENDER REQUEST INTERCEPTION ---
+EXTRACTION_INTERCEPTION_PROFILE: str = os.environ.get('EXTRACTION_INTERCEPTION_PROFILE', 'lean').lower()
+TRACKER_DOMAINS: Set[str] = {
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com', 'adservice.google.com',
+    'facebook.net', 'hotjar.com', 'clarity.ms', 'segment.io', 'segment.com', 'mixpanel.com', 'amplitude.com',
+    'fullstory.com', 'optimizely.com', 'newrelic.com', 'nr-data.net', 'sentry.io', 'criteo.com', 'taboola.com',
+    'outbrain.com', 'amazon-adsystem.com', 'adsrvr.org', 'intercom.io', 'intercomcdn.com', 'drift.com', 'crisp.chat',
+    'zdassets.com', 'tawk.to', 'livechatinc.com', 'hs-analytics.net', 'hs-scripts.com', 'tiktok.com', 'snapchat.com',
+}
+# 'record' types are aborted but their URLs are kept, which is all the image step needs.
+INTERCEPTION_PROFILES: Dict[str, Dict[str, Set[str]]] = {
+    'lean': {'block': {'media', 'font', 'websocket', 'eventsource', 'manifest', 'texttrack'}, 'record': {'image'}, 'deny_domains': TRACKER_DOMAINS},
+    'trackers': {'block': set(), 'record': set(), 'deny_domains': TRACKER_DOMAINS},
+}
+
+def _domain_matches(host: str, domains: Set[str]) -> bool:
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+def resolve_interception_policy(options: Dict[str, Any]) -> Optional[Dict[str, Set[str]]]:
+    """Builds the interception policy for a scan from its profile plus any per-request overrides."""
+    profile = options.get('intercept', EXTRACTION_INTERCEPTION_PROFILE)
+    if profile is True: profile = 'lean'
+    if not profile or profile not in INTERCEPTION_PROFILES: return None
+    policy = {key: set(values) for key, values in INTERCEPTION_PROFILES[profile].items()}
+    for key in ('block', 'record', 'deny_domains'):
+        if isinstance(extra := options.get(f"intercept_{key}"), list):
+            policy[key] |= {str(v).lower() for v in extra}
+    policy['allow_domains'] = {str(v).lower() for v in options.get('intercept_allow_domains') or []}
+    # Colours and fonts come from CSS, and the rendered page needs the document itself.
+    policy['block'] -= {'document', 'stylesheet'}
+    policy['record'] -= {'document', 'stylesheet'}
+    return policy
+
+async def install_request_interception(page: Any, policy: Dict[str, Set[str]]) -> Dict[str, Any]:
+    """Aborts requests the scan does not need. Returns live stats, including recorded image URLs."""
+    stats: Dict[str, Any] = {'allowed': 0, 'blocked': 0, 'recorded': set()}
+
+    def on_request(req: Any) -> None:
+        host = (urlparse(req.url).hostname or '').lower()
+        resource_type = req.resourceType
+        if req.isNavigationRequest() or _domain_matches(host, policy['allow_domains']):
+            decision = 'allow'
+        elif _domain_matches(host, policy['deny_domains']):
+            decision = 'block'
+        elif resource_type in policy['record']:
+            decision = 'record'
+        elif resource_type in policy['block']:
+            decision = 'block'
+        else:
+            decision = 'allow'
+        if decision == 'allow':
+            stats['allowed'] += 1
+            asyncio.ensure_future(req.continue_())
+        else:
+            stats['blocked'] += 1
+            if decision == 'record' and len(req.url) < 2048: stats['recorded'].add(req.url)
+            asyncio.ensure_future(req.abort('blockedbyclient'))
+
+    await page.setRequestInterception(True)
+    page.on('request', on_request)
+    return stats
+# --- END: RENDER REQUEST INTERCEPTION ---
+
+# --- START: ADAPTIVE LAZY-LOAD SCROLLING ---
+LAZY_SCROLL_MAX_DEPTH: int = int(os.environ.get('LAZY_SCROLL_MAX_DEPTH', 30000))
+LAZY_SCROLL_TIME_BUDGET: float = float(os.environ.get('LAZY_SCROLL_TIME_BUDGET', 8))
+LAZY_SCROLL_IDLE_SECONDS: float = 0.3
+LAZY_SCROLL_STEP_TIMEOUT: float = 1.5
+
+def lazy_scroll_limits(options: Dict[str, Any]) -> Tuple[int, float]:
+    """(max depth in px, time budget in s) requested for a scan, clamped to the configured maximums.
+
+    Missing, non-numeric or non-finite values fall back to the defaults rather than failing the scan.
+    """
     try:
-        browser = await launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage'
-            ]
-        )
-        page = await browser.newPage()
-        await page.goto(url, {'waitUntil': 'networkidle2', 'timeout': 30000})
+        max_depth = float(options.get('max_scroll_depth') or LAZY_SCROLL_MAX_DEPTH)
+    except (TypeError, ValueError):
+        max_depth = LAZY_SCROLL_MAX_DEPTH
+    try:
+        budget = float(options.get('scroll_time_budget') or LAZY_SCROLL_TIME_BUDGET)
+    except (TypeError, ValueError):
+        budget = LAZY_SCROLL_TIME_BUDGET
+    if not math.isfinite(max_depth): max_depth = LAZY_SCROLL_MAX_DEPTH
+    if not math.isfinite(budget): budget = LAZY_SCROLL_TIME_BUDGET
+    return int(max(0, min(max_depth, LAZY_SCROLL_MAX_DEPTH))), max(0.0, min(budget, LAZY_SCROLL_TIME_BUDGET))
+
+class _NetworkActivity:
+    """Counts in-flight requests on a page so scrolling can wait for quiet instead of a fixed sleep."""
+
+    def __init__(self, page: Any):
+        self.inflight = 0
+        self.last_change = time.monotonic()
+        page.on('request', self._started)
+        page.on('requestfinished', self._ended)
+        page.on('requestfailed', self._ended)
+
+    def _started(self, _req: Any) -> None:
+        self.inflight += 1
+        self.last_change = time.monotonic()
+
+    def _ended(self, _req: Any) -> None:
+        self.inflight = max(0, self.inflight - 1)
+        self.last_change = time.monotonic()
+
+    async def wait_for_quiet(self, timeout: float, idle: float = LAZY_SCROLL_IDLE_SECONDS, max_inflight: int = 2) -> bool:
+        # Like networkidle2: tolerate a couple of long-lived connections (analytics, websockets).
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.inflight <= max_inflight and time.monotonic() - self.last_change >= idle: return True
+            await asyncio.sleep(0.05)
+        return False
+
+async def scroll_for_lazy_content(page: Any, network: _NetworkActivity, max_depth: int = LAZY_SCROLL_MAX_DEPTH, time_budget: float = LAZY_SCROLL_TIME_BUDGET) -> Dict[str, Any]:
+    """Scrolls a viewport at a time, waiting for the loads each step triggers, until the page stops growing."""
+    started = time.monotonic()
+    deadline = started + time_budget
+    steps, position = 0, {'bottom': 0, 'height': 0}
+    while (remaining := deadline - time.monotonic()) > 0:
+        position = await page.evaluate('''() => {
+            window.scrollBy(0, window.innerHeight);
+            return { bottom: window.scrollY + window.innerHeight, height: document.documentElement.scrollHeight };
+        }''')
+        steps += 1
+        await network.wait_for_quiet(min(LAZY_SCROLL_STEP_TIMEOUT, remaining))
+        if position['bottom'] >= max_depth: break
+        if position['bottom'] >= position['height']:
+            # At the bottom: only keep going if the last loads grew the page (infinite scroll).
+            if await page.evaluate('() => document.documentElement.scrollHeight') <= position['height']: break
+    await network.wait_for_quiet(max(0.0, min(LAZY_SCROLL_STEP_TIMEOUT, deadline - time.monotonic())))
+    stats = {'steps': steps, 'depth': position['bottom'], 'seconds': round(time.monotonic() - started, 2)}
+    print(f"Lazy-load scroll finished: {stats}")
+    return stats
+# --- END: ADAPTIVE LAZY-LOAD SCROLLING ---
+
+# --- START: COMPUTED-STYLE SCAN ---
+STYLE_SCAN_DEFAULT_MODE: str = os.environ.get('STYLE_SCAN_DEFAULT_MODE', 'fast').lower()
+STYLE_SCAN_NODE_LIMIT: int = int(os.environ.get('STYLE_SCAN_NODE_LIMIT', 4000))
+STYLE_SCAN_MAX_COLORS: int = 512
+
+# Walks only rendered subtrees and computes styles once per signature: tag, id, class, inline style,
+# hidden attribute and the inherited (parent) colour and font.
+# Past maxNodes, large signature groups (repeated cards, list items) are strided over and each sampled
+# area is scaled up by the stride; one-off elements such as the body or a hero are always measured.
+# Colours come back as parallel, pre-ranked arrays rather than one big string-keyed map.
+COMPUTED_STYLE_FAST_SCAN_JS = '''(maxNodes, maxColors) => {
+    const SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'LINK', 'META', 'NOSCRIPT', 'TEMPLATE', 'TITLE', 'IFRAME', 'OBJECT']);
+    const styleBySignature = new Map();
+    const entryByElement = new WeakMap();
+    const stats = { mode: 'fast', nodes_total: document.getElementsByTagName('*').length, nodes_visible: 0, nodes_scanned: 0, hidden_subtrees: 0, signatures: 0, sampled_signatures: 0 };
+    // Visibility is checked on every element: a hidden attribute, an #id rule or an inline style can hide
+    // one element of a signature without hiding its look-alikes.
+    const visibilityOf = (el) => {
+        if (el.checkVisibility) {
+            return { hidden: !el.checkVisibility({ opacityProperty: true }), invisible: !el.checkVisibility({ visibilityProperty: true }) };
+        }
+        const style = window.getComputedStyle(el);
+        return { hidden: style.display === 'none' || style.opacity === '0', invisible: style.visibility !== 'visible' };
+    };
+    // Style lookups are shared only between elements that match the same rules and inherit the same
+    // colour and font, so inherited values are never attributed to the wrong elements.
+    const styleFor = (el) => {
+        let entry = entryByElement.get(el);
+        if (entry) return entry;
+        const parent = el.parentElement && entryByElement.get(el.parentElement);
+        const signature = [el.tagName, el.id, el.getAttribute('class') || '', el.getAttribute('style') || '', el.hasAttribute('hidden'),
+                           parent ? parent.font : '', parent ? parent.color : ''].join('|');
+        entry = styleBySignature.get(signature);
+        if (!entry) {
+            const style = window.getComputedStyle(el);
+            entry = { signature: signature, font: style.fontFamily, color: style.color, background: style.backgroundColor };
+            styleBySignature.set(signature, entry);
+        }
+        entryByElement.set(el, entry);
+        return entry;
+    };
+
+    const root = document.body || document.documentElement;
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT, {
+        acceptNode(el) {
+            if (SKIP_TAGS.has(el.tagName.toUpperCase())) return NodeFilter.FILTER_REJECT;
+            const visibility = visibilityOf(el);
+            if (visibility.hidden) { stats.hidden_subtrees++; return NodeFilter.FILTER_REJECT; }
+            // Resolved even when skipped, so its children inherit from the right entry.
+            styleFor(el);
+            return visibility.invisible ? NodeFilter.FILTER_SKIP : NodeFilter.FILTER_ACCEPT;
+        }
+    });
+    const groups = new Map();
+    const addVisible = (el) => {
+        const entry = styleFor(el);
+        if (!groups.has(entry.signature)) groups.set(entry.signature, { entry: entry, elements: [] });
+        groups.get(entry.signature).elements.push(el);
+        stats.nodes_visible++;
+    };
+    const rootVisibility = visibilityOf(root);
+    if (!rootVisibility.hidden) {
+        if (rootVisibility.invisible) styleFor(root); else addVisible(root);
+        while (walker.nextNode()) addVisible(walker.currentNode);
+    }
+
+    const fonts = new Set();
+    const colorsByArea = new Map();
+    const perGroup = stats.nodes_visible > maxNodes ? Math.max(8, Math.floor(maxNodes / groups.size)) : Infinity;
+    groups.forEach(({ entry, elements }) => {
+        if (entry.font) fonts.add(entry.font);
+        const stride = Math.max(1, Math.ceil(elements.length / perGroup));
+        if (stride > 1) stats.sampled_signatures++;
+        for (let i = 0; i < elements.length; i += stride) {
+            const rect = elements[i].getBoundingClientRect();
+            const area = rect.width * rect.height * Math.min(stride, elements.length - i);
+            if (area < 1) continue;
+            stats.nodes_scanned++;
+            [entry.color, entry.background].forEach(c => {
+                if (c && c !== 'rgba(0, 0, 0, 0)') colorsByArea.set(c, (colorsByArea.get(c) || 0) + area);
+            });
+        }
+    });
+    stats.signatures = styleBySignature.size;
+
+    const ranked = Array.from(colorsByArea.entries()).sort((a, b) => b[1] - a[1]).slice(0, maxColors);
+    return { fonts: Array.from(fonts), colors: ranked.map(c => c[0]), weights: ranked.map(c => Math.round(c[1])), stats: stats };
+}'''
+
+# The original exhaustive scan, kept as style_scan='full' for comparison and for pages the fast scan misjudges.
+COMPUTED_STYLE_FULL_SCAN_JS = '''() => {
+    const elements = document.querySelectorAll('*:not(script):not(style):not(link):not(meta)');
+    const fontFamilies = new Set();
+    const colorsByArea = {};
+    elements.forEach(el => {
+        const style = window.getComputedStyle(el);
+        const rect = el.getBoundingClientRect();
+        const area = rect.width * rect.height;
+        if (area < 1) return;
+        if (style.fontFamily) fontFamilies.add(style.fontFamily);
+        ['color', 'backgroundColor'].forEach(prop => {
+            const c = style[prop];
+            if (c && c !== 'rgba(0, 0, 0, 0)') {
+                colorsByArea[c] = (colorsByArea[c] || 0) + area;
+            }
+        });
+    });
+    return { fonts: Array.from(fontFamilies), colors: Object.keys(colorsByArea), weights: Object.values(colorsByArea),
+             stats: { mode: 'full', nodes_total: elements.length, nodes_scanned: elements.length } };
+}'''
+
+async def scan_computed_styles(page: Any, mode: str = STYLE_SCAN_DEFAULT_MODE) -> Dict[str, Any]:
+    """Collects font stacks and area-weighted colours from a rendered page. Returns {'fonts', 'colors', 'stats'}."""
+    started = time.perf_counter()
+    if mode == 'full':
+        raw = await page.evaluate(COMPUTED_STYLE_FULL_SCAN_JS)
+    else:
+        raw = await page.evaluate(COMPUTED_STYLE_FAST_SCAN_JS, STYLE_SCAN_NODE_LIMIT, STYLE_SCAN_MAX_COLORS)
+    stats = dict(raw.get('stats') or {}, elapsed_ms=round((time.perf_counter() - started) * 1000))
+    return {'fonts': raw.get('fonts', []), 'colors': dict(zip(raw.get('colors', []), raw.get('weights', []))), 'stats': stats}
+# --- END: COMPUTED-STYLE SCAN ---
+
+ProgressCallback = Callable[[str], None]
+SectionCallback = Callable[[str, Any], None]
+ExtractionResult = Tuple[Set[str], List[Dict[str, str]], Dict[str, float], Dict[str, Any]]
+
+async def extract_assets_from_page_async(url: str, options: Dict[str, Any], progress: Optional[ProgressCallback] = None, on_section: Optional[SectionCallback] = None,
+                                         deadline: Optional[ExtractionDeadline] = None, prefetched_stylesheets: Optional[Dict[str, str]] = None) -> ExtractionResult:
+    print(f"Analyzing page using Enhanced Hybrid Method: {url}")
+    report = progress or (lambda phase: None)
+    emit = on_section or (lambda kind, value: None)
+    deadline = deadline or ExtractionDeadline.from_options(options)
+    loop = asyncio.get_running_loop()
+    async with AsyncExitStack() as stack:
+        # Waiting for a free browser and launching one are charged to the request's budget like any phase.
+        with deadline.phase('browser'):
+            try:
+                page = await stack.enter_async_context(BROWSER_POOL.page(acquire_timeout=deadline.allowance('browser')))
+            except asyncio.TimeoutError:
+                deadline.mark_incomplete('browser', 'no browser became free within its share of the time budget')
+                return set(), [], {}, {'source': 'browser', 'style_scan': None}
+        interception = None
+        if policy := resolve_interception_policy(options):
+            interception = await install_request_interception(page, policy)
+        network = _NetworkActivity(page)
+        report('navigating')
+        with deadline.phase('navigate'):
+            try:
+                await page.goto(url, {'waitUntil': 'networkidle2', 'timeout': max(1000, int(deadline.allowance('navigate') * 1000))})
+            except PyppeteerTimeoutError:
+                # Slow trackers and long-polling keep some pages from ever going idle; scan what has rendered.
+                deadline.mark_incomplete('navigate', 'the page did not settle within its share of the time budget')
 
         if options.get('extract_images'):
+            report('scrolling')
             print("Scrolling to trigger lazy-loading...")
-            await page.evaluate('''
-                async () => {
-                    await new Promise((resolve) => {
-                        let totalHeight = 0;
-                        const distance = 100;
-                        const timer = setInterval(() => {
-                            const scrollHeight = document.body.scrollHeight;
-                            window.scrollBy(0, distance);
-                            totalHeight += distance;
-                            if (totalHeight >= scrollHeight) {
-                                clearInterval(timer);
-                                resolve();
-                            }
-                        }, 100);
-                    });
-                }
-            ''')
-            await asyncio.sleep(2)
+            max_depth, scroll_budget = lazy_scroll_limits(options)
+            scroll_budget = min(scroll_budget, deadline.allowance('scroll'))
+            await deadline.run_phase('scroll', scroll_for_lazy_content(page, network, max_depth, scroll_budget), timeout=scroll_budget + LAZY_SCROLL_STEP_TIMEOUT)
 
-        final_html = await page.content()
-        soup = BeautifulSoup(final_html, 'html.parser')
+        final_html = await deadline.run_phase('snapshot', page.content(), fallback='')
+        scan = scan_html_assets(final_html, url)
 
         images, fonts, colors = set(), [], {}
+        stylesheet_task, assets = None, None
 
         if options.get('extract_images'):
-            images = extract_all_images_from_html(soup, url).union(extract_css_background_images(soup, url))
+            report('images')
+            images = scan['images'] | scan['inline_backgrounds']
+            if interception:
+                images |= {u for u in interception['recorded'] if not u.startswith('data:')}
+            emit('images', images)
+            # Stylesheet fetches block, so keep them off the pool loop that other scans share. They run
+            # alongside the computed-style walk below and are only awaited once it is done.
+            stylesheet_budget = min(STYLESHEET_PHASE_BUDGET, deadline.allowance('stylesheets'))
+            def fetch_stylesheet_images() -> Set[str]:
+                with deadline.phase('stylesheets'):
+                    return extract_stylesheet_image_urls(fetch_stylesheets(scan['stylesheets'], stylesheet_budget,
+                        on_budget_exhausted=lambda pending: deadline.mark_incomplete('stylesheets', f'{pending} sheets still loading'),
+                        prefetched=prefetched_stylesheets))
+            stylesheet_task = loop.run_in_executor(None, fetch_stylesheet_images)
+
+        if interception:
+            print(f"Request interception: {interception['allowed']} allowed, {interception['blocked']} blocked.")
 
         if options.get('extract_fonts') or options.get('extract_colors'):
-            assets = await page.evaluate('''() => {
-                const elements = document.querySelectorAll('*:not(script):not(style):not(link):not(meta)');
-                const fontFamilies = new Set();
-                const colorsByArea = {};
-                elements.forEach(el => {
-                    const style = window.getComputedStyle(el);
-                    const rect = el.getBoundingClientRect();
-                    const area = rect.width * rect.height;
-                    if (area < 1) return;
-                    if (style.fontFamily) fontFamilies.add(style.fontFamily);
-                    ['color', 'backgroundColor'].forEach(prop => {
-                        const c = style[prop];
-                        if (c && c !== 'rgba(0, 0, 0, 0)') {
-                            colorsByArea[c] = (colorsByArea[c] || 0) + area;
-                        }
-                    });
-                });
-                return { fonts: Array.from(fontFamilies), colors: colorsByArea };
-            }''')
-
-            if options.get('extract_colors'):
-                colors = assets.get('colors', {})
+            report('fonts' if options.get('extract_fonts') else 'colors')
+            assets = await deadline.run_phase('styles', scan_computed_styles(page, options.get('style_scan') or STYLE_SCAN_DEFAULT_MODE))
 
-            if options.get('extract_fonts'):
+            if options.get('extract_fonts') and assets is not None:
                 is_adobe_site = 'use.typekit.net' in final_html
-                google_link_fonts = extract_fonts_from_google_links(soup)
+                google_link_fonts = scan['google_fonts']
                 computed_fonts = assets.get('fonts', [])
-                fonts = process_fonts(computed_fonts, google_link_fonts, is_adobe_site)
-        
-        return images, fonts, colors
+                fonts = await deadline.run_phase('fonts', loop.run_in_executor(None, process_fonts, computed_fonts, google_link_fonts, is_adobe_site), fallback=[])
+                emit('fonts', fonts)
+
+            if options.get('extract_colors') and assets is not None:
+                colors = assets.get('colors', {})
+                emit('colors', colors)
+
+        if stylesheet_task is not None:
+            # fetch_stylesheets stops itself at stylesheet_budget; the margin only covers parsing what arrived.
+            stylesheet_images = await deadline.run_phase('stylesheets_wait', stylesheet_task, fallback=set(), timeout=stylesheet_budget + 5)
+            emit('images', stylesheet_images - images)
+            images |= stylesheet_images
+
+        return images, fonts, colors, {'source': 'browser', 'style_scan': assets['stats'] if assets else None}
+
+# --- START: EXTRACTION RESULT CACHE ---
+EXTRACTION_CACHE_BACKEND: str = os.environ.get('EXTRACTION_CACHE_BACKEND', 'disk').lower()
+EXTRACTION_CACHE_TTL: int = int(os.environ.get('EXTRACTION_CACHE_TTL', 3600))
+EXTRACTION_CACHE_MAX_ENTRIES: int = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', 500))
+EXTRACTION_CACHE_KEY_OPTIONS: List[str] = ['extract_images', 'extract_fonts', 'extract_colors', 'intercept', 'intercept_block', 'intercept_record', 'intercept_deny_domains', 'intercept_allow_domains', 'max_scroll_depth', 'scroll_time_budget', 'mode', 'style_scan', 'dedupe', 'probe']
+TRACKING_QUERY_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid)$', re.IGNORECASE)
+
+def normalize_extraction_url(url: str) -> str:
+    """Canonical form of a scan URL: lowercase host, no default port, fragment or tracking params, sorted query."""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower() or 'https'
+    host = (parsed.hostname or '').lower()
+    if parsed.port and (scheme, parsed.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parsed.port}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if not TRACKING_QUERY_PARAMS.match(k)))
+    return urlunparse((scheme, host, parsed.path or '/', '', query, ''))
+
+class ExtractionResultCache:
+    """TTL + LRU cache for scan results.
+
+    The ``disk`` backend is a small SQLite file in the instance folder that every gunicorn worker
+    shares; ``memory`` keeps a per-process cache and ``off`` disables caching.
+    """
+
+    def __init__(self, backend: str, path: str, ttl: int, max_entries: int):
+        self.backend = backend
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: TTLCache = TTLCache(maxsize=max(1, max_entries), ttl=ttl)
+        self._lock = threading.Lock()
+        if backend == 'disk':
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS scan_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS scan_cache_accessed ON scan_cache (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        """A connection for one transaction: committed (or rolled back) and then closed."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(url: str, options: Dict[str, Any]) -> str:
+        flags = {name: bool(options.get(name)) if name.startswith('extract_') else options.get(name) for name in EXTRACTION_CACHE_KEY_OPTIONS}
+        return hashlib.sha256(json.dumps([normalize_extraction_url(url), flags], sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if self.backend == 'memory':
+            with self._lock: return self._memory.get(key)
+        if self.backend != 'disk': return None
+        try:
+            with self._connect() as conn:
+                now = time.time()
+                row = conn.execute('SELECT value FROM scan_cache WHERE key = ? AND created_at > ?', (key, now - self.ttl)).fetchone()
+                if row is None: return None
+                conn.execute('UPDATE scan_cache SET accessed_at = ? WHERE key = ?', (now, key))
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Extraction cache read failed: {e}")
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        if self.backend == 'memory':
+            with self._lock: self._memory[key] = value
+            return
+        if self.backend != 'disk': return
+        try:
+            with self._connect() as conn:
+                now = time.time()
+                conn.execute('INSERT OR REPLACE INTO scan_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)', (key, json.dumps(value), now, now))
+                conn.execute('DELETE FROM scan_cache WHERE created_at <= ?', (now - self.ttl,))
+                conn.execute('DELETE FROM scan_cache WHERE key IN (SELECT key FROM scan_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+        except sqlite3.Error as e:
+            print(f"Extraction cache write failed: {e}")
+
+EXTRACTION_CACHE = ExtractionResultCache(EXTRACTION_CACHE_BACKEND, os.path.join(app.instance_path, 'extraction_cache.db'), EXTRACTION_CACHE_TTL, EXTRACTION_CACHE_MAX_ENTRIES)
+
+# --- END: EXTRACTION RESULT CACHE ---
+
+# --- START: STATIC (NO-BROWSER) EXTRACTION ---
+EXTRACTION_DEFAULT_MODE: str = os.environ.get('EXTRACTION_DEFAULT_MODE', 'auto').lower()
+STATIC_FETCH_TIMEOUT: float = 8.0
+STATIC_MAX_HTML_BYTES: int = 5 * 1024 * 1024
+STATIC_MIN_IMAGES: int = 3
+STATIC_MIN_BODY_TEXT: int = 200
+STATIC_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+SPA_ROOT_IDS: Set[str] = {'root', 'app', '__next', '__nuxt', 'svelte', 'ember-app', 'main-app'}
+CSS_FONT_FAMILY_PATTERN = re.compile(r'font-family\s*:\s*([^;{}!]+)', re.IGNORECASE)
+
+STATIC_REQUEST_HEADERS: Dict[str, str] = {'User-Agent': STATIC_USER_AGENT, 'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8'}
+
+def fetch_static_html(url: str, timeout: float = STATIC_FETCH_TIMEOUT) -> Tuple[str, str]:
+    """Fetches a page's HTML without rendering it. Returns (final_url, html)."""
+    with OUTBOUND_HTTP.stream('GET', url, headers=STATIC_REQUEST_HEADERS, timeout=timeout, max_bytes=STATIC_MAX_HTML_BYTES) as resp:
+        resp.raise_for_status()
+        if 'html' not in resp.headers.get('Content-Type', 'text/html'):
+            raise ValueError(f"Not an HTML document: {resp.headers.get('Content-Type')}")
+        body = b''.join(OUTBOUND_HTTP.iter_capped(resp))
+        # requests assumes ISO-8859-1 for text/* without a charset, which mangles most modern pages.
+        encoding = resp.encoding if 'charset' in resp.headers.get('Content-Type', '').lower() else 'utf-8'
+        return resp.url, body.decode(encoding or 'utf-8', errors='replace')
+
+def find_render_escalation_reason(scan: Dict[str, Any], options: Dict[str, Any], image_count: int, font_stack_count: int) -> Optional[str]:
+    """Returns why a statically fetched page still needs a headless render, or None if it does not."""
+    if not scan['has_body']: return 'no <body> in the initial HTML'
+    if scan['empty_spa_root']: return f"empty single-page-app root #{scan['empty_spa_root']}"
+    if scan['body_text_chars'] < STATIC_MIN_BODY_TEXT and image_count < STATIC_MIN_IMAGES:
+        return 'near-empty body'
+    if options.get('extract_images') and image_count < STATIC_MIN_IMAGES:
+        return f'only {image_count} images in the initial HTML'
+    if options.get('extract_fonts') and not font_stack_count:
+        return 'no font declarations in the initial HTML'
+    return None
+
+def extract_assets_statically(url: str, options: Dict[str, Any], force: bool = False, deadline: Optional[ExtractionDeadline] = None,
+                              fetched_stylesheets: Optional[Dict[str, str]] = None) -> Tuple[Optional[ExtractionResult], Optional[str]]:
+    """Runs the HTML helpers over a plain HTTP fetch. Returns (result, None), or (None, reason) to escalate.
+
+    Stylesheets fetched along the way are added to `fetched_stylesheets`, if given, so an escalated
+    render can reuse them instead of downloading them again.
+    """
+    # Computed colours only exist in a render; do not spend the deadline on fetches that get redone.
+    if not force and options.get('extract_colors'): return None, 'computed colours requested'
+    deadline = deadline or ExtractionDeadline.from_options(options)
+    try:
+        with deadline.phase('static_fetch'):
+            final_url, html = fetch_static_html(url, timeout=min(STATIC_FETCH_TIMEOUT, deadline.allowance('static_fetch')))
+    except (requests.RequestException, ValueError) as e:
+        if force: raise
+        return None, f'static fetch failed: {e}'
+    scan = scan_html_assets(html, final_url)
+    still_loading: List[int] = []
+    with deadline.phase('static_stylesheets'):
+        stylesheets = fetch_stylesheets(scan['stylesheets'], min(STYLESHEET_PHASE_BUDGET, deadline.allowance('static_stylesheets')), on_budget_exhausted=still_loading.append)
+    if fetched_stylesheets is not None: fetched_stylesheets.update(stylesheets)
+
+    images: Set[str] = set()
+    if options.get('extract_images'):
+        images = scan['images'] | scan['inline_backgrounds'] | extract_stylesheet_image_urls(stylesheets)
+
+    font_stacks: List[str] = []
+    if options.get('extract_fonts'):
+        css_sources = [css_text for _, css_text in stylesheets] + scan['style_blocks'] + scan['inline_font_styles']
+        font_stacks = sorted({stack.strip() for css in css_sources for stack in CSS_FONT_FAMILY_PATTERN.findall(css) if stack.strip()})
+
+    if not force and (reason := find_render_escalation_reason(scan, options, len(images), len(font_stacks))):
+        return None, reason
+
+    # Only a result that is actually returned counts against completeness; an escalated one is redone.
+    if still_loading: deadline.mark_incomplete('static_stylesheets', f'{still_loading[0]} sheets still loading')
+    fonts: List[Dict[str, str]] = []
+    if options.get('extract_fonts'):
+        with deadline.phase('fonts'):
+            fonts = process_fonts(font_stacks, scan['google_fonts'], scan['has_typekit'] or 'use.typekit.net' in html)
+    return (images, fonts, {}, {'source': 'static'}), None
+# --- END: STATIC (NO-BROWSER) EXTRACTION ---
+
+# --- START: IMAGE VARIANT DE-DUPLICATION ---
+IMAGE_DEDUPE_DEFAULT_MODE: str = os.environ.get('IMAGE_DEDUPE_DEFAULT_MODE', 'url').lower()
+IMAGE_DEDUPE_WORKERS: int = int(os.environ.get('IMAGE_DEDUPE_WORKERS', 8))
+IMAGE_DEDUPE_TIME_BUDGET: float = float(os.environ.get('IMAGE_DEDUPE_TIME_BUDGET', 10))
+IMAGE_HASH_MAX_BYTES: int = 3 * 1024 * 1024
+IMAGE_HASH_MAX_DISTANCE: int = 6
+# Query parameters image CDNs use to resize or re-encode the same picture. They pick a rendition, so they
+# are only stripped on IMAGE_SERVICE_HOSTS; elsewhere "?size=2" or "?format=png" may well select other content.
+# Cache-busters such as "v" are never stripped: a new version is a new image.
+IMAGE_RESIZE_QUERY_PARAMS: Set[str] = {'w', 'h', 'width', 'height', 'wid', 'hei', 'imwidth', 'imheight', 'sz', 'size', 'resize', 'scale',
+                                       'q', 'qlt', 'quality', 'fit', 'crop', 'dpr', 'auto', 'fm', 'format', 'im'}
+# Image CDNs and services (matched with their subdomains) whose query strings only choose a rendition.
+IMAGE_SERVICE_HOSTS: Set[str] = {'imgix.net', 'cloudinary.com', 'cdn.shopify.com', 'ctfassets.net', 'cdn.sanity.io', 'images.unsplash.com',
+                                 'wp.com', 'scene7.com', 'imagekit.io', 'twic.pics', 'cloudimg.io', 'images.prismic.io', 'datocms-assets.com',
+                                 'storyblok.com', 'squarespace-cdn.com', 'wixstatic.com', 'bigcommerce.com', 'akamaized.net'} | {
+                                 h.strip().lower() for h in os.environ.get('IMAGE_SERVICE_HOSTS', '').split(',') if h.strip()}
+IMAGE_WIDTH_QUERY_PARAMS: Tuple[str, ...] = ('w', 'width', 'wid', 'imwidth', 'sz', 'size')
+IMAGE_EXTENSION_LOOKAHEAD = r'(?=\.(?:jpe?g|png|gif|webp|avif)$)'
+WORDPRESS_SIZE_SUFFIX = re.compile(r'-(\d+)x(\d+)' + IMAGE_EXTENSION_LOOKAHEAD, re.IGNORECASE)
+SHOPIFY_SIZE_SUFFIX = re.compile(r'_(?:(\d+)x\d*|x(\d+))(?:_crop_[a-z]+)?(?:@(\d)x)?' + IMAGE_EXTENSION_LOOKAHEAD, re.IGNORECASE)
+# Size suffixes only mean "resized copy" where the platform generates them; elsewhere "-300x200" may be part of the name.
+WORDPRESS_PATH_MARKERS: Tuple[str, ...] = ('/wp-content/uploads/',)
+SHOPIFY_PATH_MARKERS: Tuple[str, ...] = ('/cdn/shop/', '/s/files/')
+CLOUDINARY_TRANSFORM_SEGMENT = re.compile(r'^[a-z]{1,3}_[^,/]+(?:,[a-z]{1,3}_[^,/]+)*$', re.IGNORECASE)
+CLOUDINARY_WIDTH = re.compile(r'(?:^|,)w_(\d+)')
+
+def _as_number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def is_image_service_host(hostname: str) -> bool:
+    labels = hostname.lower().split('.')
+    return any('.'.join(labels[i:]) in IMAGE_SERVICE_HOSTS for i in range(len(labels) - 1))
+
+def canonicalize_image_url(url: str) -> Tuple[str, Optional[float]]:
+    """Strips known CDN resize markers from an image URL. Returns (canonical_key, requested_width).
+
+    Resize query parameters and Cloudinary-style transform segments are only read and stripped on
+    IMAGE_SERVICE_HOSTS, and WordPress/Shopify size suffixes only under those platforms' upload paths.
+    The width is None when the URL carries no resize marker, which usually means it is the original.
+    """
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    params = {k.lower(): v for k, v in query}
+    if parsed.path.endswith('/_next/image') and params.get('url'):
+        # Next.js image optimizer: the real image is in ?url=, the width in ?w=.
+        inner_key, _ = canonicalize_image_url(urljoin(url, params['url']))
+        return inner_key, _as_number(params.get('w'))
+
+    width = None
+    if image_service := is_image_service_host(parsed.hostname or ''):
+        width = next((w for key in IMAGE_WIDTH_QUERY_PARAMS if (w := _as_number(params.get(key)))), None)
+        if width and (dpr := _as_number(params.get('dpr'))): width *= dpr
+    path = parsed.path
+    if image_service and ('/upload/' in path or '/fetch/' in path):
+        marker = '/upload/' if '/upload/' in path else '/fetch/'
+        head, tail = path.split(marker, 1)
+        segments = tail.split('/')
+        while len(segments) > 1 and CLOUDINARY_TRANSFORM_SEGMENT.match(segments[0]):
+            if match := CLOUDINARY_WIDTH.search(segments[0]): width = width or float(match.group(1))
+            segments.pop(0)
+        path = head + marker + '/'.join(segments)
+    if any(marker in path for marker in WORDPRESS_PATH_MARKERS) and (match := WORDPRESS_SIZE_SUFFIX.search(path)):
+        width = width or float(match.group(1))
+        path = path[:match.start()] + path[match.end():]
+    elif (image_service or any(marker in path for marker in SHOPIFY_PATH_MARKERS)) and (match := SHOPIFY_SIZE_SUFFIX.search(path)):
+        if match.group(1): width = width or float(match.group(1)) * float(match.group(3) or 1)
+        path = path[:match.start()] + path[match.end():]
+
+    kept_query = urlencode(sorted((k, v) for k, v in query if not (image_service and k.lower() in IMAGE_RESIZE_QUERY_PARAMS)))
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}?{kept_query}", width
+
+def group_image_variants(urls: Set[str]) -> Dict[str, List[str]]:
+    """Groups URLs that are resized variants of one image. Returns {kept_url: [every variant, kept_url included]}.
+
+    Within a group the original (no resize marker) wins, then the widest variant, then the shortest URL.
+    """
+    groups: Dict[str, List[Tuple[float, str]]] = {}
+    for url in urls:
+        key, width = canonicalize_image_url(url)
+        groups.setdefault(key, []).append((float('inf') if width is None else width, url))
+    result: Dict[str, List[str]] = {}
+    for members in groups.values():
+        members.sort(key=lambda m: (-m[0], len(m[1]), m[1]))
+        result[members[0][1]] = [url for _, url in members]
+    return result
+
+def image_dhash(data: bytes) -> Optional[Tuple[int, int]]:
+    """64-bit difference hash of an image plus its full pixel count, or None if Pillow cannot read it."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            pixels = img.width * img.height
+            img.draft('L', (64, 64))  # JPEGs decode straight at a fraction of their size
+            small = img.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+    px = np.asarray(small, dtype=np.int16)
+    return int(np.packbits(px[:, 1:] > px[:, :-1]).view('>u8')[0]), pixels
 
+def _hash_image(url: str, timeout: float) -> Optional[Tuple[int, int]]:
+    try:
+        resp = OUTBOUND_HTTP.get(url, headers={'User-Agent': STATIC_USER_AGENT}, timeout=timeout, max_bytes=IMAGE_HASH_MAX_BYTES)
+        resp.raise_for_status()
+    except requests.RequestException:
+        return None
+    return image_dhash(resp.content)
+
+def group_images_perceptually(groups: Dict[str, List[str]], time_budget: float = IMAGE_DEDUPE_TIME_BUDGET) -> Dict[str, List[str]]:
+    """Merges URL groups whose kept images look the same, keeping the one with the most pixels.
+
+    Images are fetched concurrently within time_budget; anything that does not arrive in time,
+    is too large or is not a raster image keeps its own group.
+    """
+    deadline = time.monotonic() + time_budget
+    hashes: Dict[str, Tuple[int, int]] = {}
+    executor = ThreadPoolExecutor(max_workers=IMAGE_DEDUPE_WORKERS, thread_name_prefix='image-dedupe')
+    try:
+        pending = {executor.submit(_hash_image, url, max(1.0, min(5.0, time_budget))): url for url in groups}
+        done, not_done = wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+        for future in done:
+            if (result := future.result()) is not None: hashes[pending[future]] = result
+        if not_done: print(f"Image hashing budget of {time_budget}s exhausted with {len(not_done)} images still loading.")
     finally:
-        if browser:
-            await browser.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+    if len(hashes) < 2: return groups
+
+    urls = sorted(hashes, key=lambda u: -hashes[u][1])
+    values = np.array([hashes[u][0] for u in urls], dtype=np.uint64)
+    merged: Dict[str, List[str]] = {url: members for url, members in groups.items() if url not in hashes}
+    remaining = np.arange(len(urls))
+    while remaining.size:
+        # Hamming distance from the largest unassigned image to every other unassigned one.
+        xor = (values[remaining] ^ values[remaining[0]]).view(np.uint8).reshape(-1, 8)
+        close = np.unpackbits(xor, axis=1).sum(axis=1) <= IMAGE_HASH_MAX_DISTANCE
+        leader = urls[remaining[0]]
+        merged[leader] = [member for i in remaining[close] for member in groups[urls[i]]]
+        remaining = remaining[~close]
+    return merged
+
+def dedupe_image_urls(urls: Set[str], mode: str = IMAGE_DEDUPE_DEFAULT_MODE, time_budget: float = IMAGE_DEDUPE_TIME_BUDGET) -> Set[str]:
+    """Collapses CDN variants ('url') and, optionally, visually identical images ('perceptual')."""
+    if mode == 'off' or len(urls) < 2: return set(urls)
+    groups = group_image_variants(urls)
+    if mode == 'perceptual': groups = group_images_perceptually(groups, time_budget)
+    return set(groups)
+# --- END: IMAGE VARIANT DE-DUPLICATION ---
+
+# --- START: IMAGE METADATA PROBING ---
+IMAGE_PROBE_WORKERS: int = int(os.environ.get('IMAGE_PROBE_WORKERS', 8))
+IMAGE_PROBE_TIME_BUDGET: float = float(os.environ.get('IMAGE_PROBE_TIME_BUDGET', 6))
+IMAGE_PROBE_MAX_IMAGES: int = int(os.environ.get('IMAGE_PROBE_MAX_IMAGES', 200))
+IMAGE_PROBE_BYTES: int = 32 * 1024
+CONTENT_RANGE_TOTAL = re.compile(r'/\s*(\d+)\s*$')
+SVG_DIMENSION = re.compile(rb'<svg[^>]*?\swidth="([\d.]+)(?:px)?"[^>]*?\sheight="([\d.]+)(?:px)?"', re.IGNORECASE | re.DOTALL)
+
+_probe_executor: Optional[ThreadPoolExecutor] = None
+_probe_executor_pid: Optional[int] = None
+_probe_executor_lock = threading.Lock()
+
+def _get_probe_executor() -> ThreadPoolExecutor:
+    """One executor per process, so IMAGE_PROBE_WORKERS caps probes across all concurrent scans."""
+    global _probe_executor, _probe_executor_pid
+    with _probe_executor_lock:
+        if _probe_executor is None or _probe_executor_pid != os.getpid():
+            _probe_executor = ThreadPoolExecutor(max_workers=IMAGE_PROBE_WORKERS, thread_name_prefix='image-probe')
+            _probe_executor_pid = os.getpid()
+        return _probe_executor
+
+def probe_image(url: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Reads an image's size, format and dimensions from its headers and first few KB only."""
+    headers = {'User-Agent': STATIC_USER_AGENT, 'Range': f'bytes=0-{IMAGE_PROBE_BYTES - 1}'}
+    head = b''
+    try:
+        # Servers that ignore Range send the whole file; the body is abandoned after IMAGE_PROBE_BYTES either way.
+        with OUTBOUND_HTTP.stream('GET', url, headers=headers, timeout=timeout, max_bytes=sys.maxsize) as resp:
+            if resp.status_code not in (200, 206): return None
+            for chunk in OUTBOUND_HTTP.iter_capped(resp, 8 * 1024):
+                head += chunk
+                if len(head) >= IMAGE_PROBE_BYTES: break
+            content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if resp.status_code == 206 and (total := CONTENT_RANGE_TOTAL.search(resp.headers.get('Content-Range', ''))):
+                size: Optional[int] = int(total.group(1))
+            else:
+                size = int(declared) if (declared := resp.headers.get('Content-Length', '')).isdigit() else None
+    except requests.RequestException:
+        return None
 
-def extract_assets_from_page(url: str, options: Dict[str, Any]) -> Tuple[Set[str], List[Dict[str, str]], Dict[str, float]]:
-    if sys.version_info >= (3, 8) and os.name == 'posix':
+    info: Dict[str, Any] = {'bytes': size, 'content_type': content_type or None, 'format': None, 'width': None, 'height': None}
+    if 'svg' in content_type or head.lstrip()[:5] in (b'<?xml', b'<svg '):
+        info['format'] = 'SVG'
+        if match := SVG_DIMENSION.search(head):
+            info['width'], info['height'] = round(float(match.group(1))), round(float(match.group(2)))
+        return info
+    try:
+        # Image.open only parses the header here; nothing is decoded.
+        with Image.open(io.BytesIO(head)) as img:
+            info.update(format=img.format, width=img.width, height=img.height)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        pass
+    return info
+
+def probe_images(urls: Set[str], time_budget: float = IMAGE_PROBE_TIME_BUDGET) -> Dict[str, Dict[str, Any]]:
+    """Probes up to IMAGE_PROBE_MAX_IMAGES images concurrently. Returns {url: info} for those that answered in time."""
+    deadline = time.monotonic() + time_budget
+    executor = _get_probe_executor()
+    pending = {executor.submit(probe_image, url, max(1.0, min(5.0, time_budget))): url for url in sorted(urls)[:IMAGE_PROBE_MAX_IMAGES]}
+    done, not_done = wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+    for future in not_done: future.cancel()
+    if not_done: print(f"Image probe budget of {time_budget}s exhausted with {len(not_done)} images unprobed.")
+    return {pending[future]: info for future in done if not future.cancelled() and (info := future.result()) is not None}
+# --- END: IMAGE METADATA PROBING ---
+
+def extract_assets_from_page(url: str, options: Dict[str, Any], progress: Optional[ProgressCallback] = None, on_section: Optional[SectionCallback] = None) -> ExtractionResult:
+    """Scans a page, preferring the result cache, then the static path, then a headless render.
+
+    on_section, if given, is called with ('images' | 'fonts' | 'colors', value) as the headless render
+    finishes each part; image sections only carry URLs not reported before. Cached and static results
+    arrive all at once, so callers should still read the returned tuple.
+    """
+    cache_key = EXTRACTION_CACHE.make_key(url, options)
+    if not options.get('force_refresh') and (cached := EXTRACTION_CACHE.get(cache_key)) is not None:
+        print(f"Serving cached scan for {url}")
+        return set(cached['images']), cached['fonts'], cached['colors'], dict(cached.get('meta') or {'source': 'browser'}, cached=True)
+
+    mode = options.get('mode') or EXTRACTION_DEFAULT_MODE
+    deadline = ExtractionDeadline.from_options(options)
+    result, escalation_reason = None, None
+    fetched_stylesheets: Dict[str, str] = {}
+    if mode in ('auto', 'static'):
+        if progress: progress('navigating')
+        result, escalation_reason = extract_assets_statically(url, options, force=(mode == 'static'), deadline=deadline, fetched_stylesheets=fetched_stylesheets)
+    if result is None:
+        if escalation_reason: print(f"Escalating {url} to headless render: {escalation_reason}")
         try:
-            asyncio.get_running_loop()
-        except RuntimeError:
-            asyncio.set_event_loop(asyncio.new_event_loop())
-    return asyncio.run(extract_assets_from_page_async(url, options))
+            images, fonts, colors, meta = BROWSER_POOL.run(extract_assets_from_page_async(url, options, progress, on_section, deadline, fetched_stylesheets),
+                                                           timeout=deadline.remaining() + BROWSER_RUN_GRACE_SECONDS)
+        except FutureTimeoutError:
+            # The scan was cancelled past its budget; report it as an incomplete scan rather than an error.
+            deadline.mark_incomplete('browser', 'the headless render did not finish within the time budget')
+            images, fonts, colors, meta = set(), [], {}, {'source': 'browser', 'style_scan': None}
+        if escalation_reason: meta['escalation_reason'] = escalation_reason
+        result = (images, fonts, colors, meta)
+
+    images, fonts, colors, meta = result
+    dedupe_mode = options.get('dedupe') or IMAGE_DEDUPE_DEFAULT_MODE
+    if len(images) > 1 and dedupe_mode != 'off':
+        with deadline.phase('dedupe'):
+            deduped = dedupe_image_urls(images, dedupe_mode, min(IMAGE_DEDUPE_TIME_BUDGET, deadline.allowance('dedupe')))
+        if removed := len(images) - len(deduped): meta['duplicates_removed'] = removed
+        images = deduped
+        result = (images, fonts, colors, meta)
+    if options.get('probe') and images:
+        with deadline.phase('probe'):
+            meta['image_info'] = probe_images(images, min(IMAGE_PROBE_TIME_BUDGET, deadline.allowance('probe')))
+    meta.update(deadline.meta())
+    # A partial scan reflects a slow moment, not the page, so it is never cached; neither are fonts
+    # classified before the Google Fonts catalog was available, which would all come out non-Google.
+    if not meta.get('partial') and (not fonts or GOOGLE_FONTS_CATALOG.is_loaded()):
+        EXTRACTION_CACHE.set(cache_key, {'images': sorted(images), 'fonts': fonts, 'colors': colors,
+                                         'meta': {k: v for k, v in meta.items() if k not in ('timings', 'time_budget')}})
+    return result
     
 FlaskResponse = Union[Response, Tuple[Union[str, Response], int]]
 
@@ -690,6 +2135,429 @@ def track_usage(tool_name: str, metadata: Optional[Dict] = None):
         db.session.commit()
         log_user_activity('tool_usage', details=tool_name)
 
+# --- START: BACKGROUND EXTRACTION JOBS ---
+EXTRACTION_WORKERS: int = int(os.environ.get('EXTRACTION_WORKERS', 2))
+EXTRACTION_MAX_PENDING_JOBS: int = int(os.environ.get('EXTRACTION_MAX_PENDING_JOBS', 20))
+EXTRACTION_JOB_TTL: int = int(os.environ.get('EXTRACTION_JOB_TTL', 900))
+# An event stream holds a web worker, so it closes after this long and the browser's EventSource reconnects.
+EXTRACTION_EVENTS_MAX_STREAM: int = int(os.environ.get('EXTRACTION_EVENTS_MAX_STREAM', 25))
+EXTRACTION_EVENTS_RETRY_MS: int = 2000
+EXTRACTION_JOBS_DIR = os.path.join(app.instance_path, 'extraction_jobs')
+os.makedirs(EXTRACTION_JOBS_DIR, exist_ok=True)
+
+EXTRACTION_BUSY_ERROR = 'The extractor is busy right now. Please try again in a moment.'
+EXTRACTION_TIME_BUDGET_ERROR = 'The site did not finish loading within the time budget.'
+EXTRACTION_EMPTY_ERROR = 'Could not extract any assets. The site may be protected or empty.'
+
+def extraction_meta_fields(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """The scan metadata reported alongside results, shared by the sync body and the stream summary."""
+    fields: Dict[str, Any] = {'source': meta.get('source', 'browser')}
+    if meta.get('cached'): fields['cached'] = True
+    for key in ('escalation_reason', 'style_scan', 'duplicates_removed', 'timings'):
+        if meta.get(key): fields[key] = meta[key]
+    if meta.get('partial'): fields.update(partial=True, incomplete_phases=meta.get('incomplete_phases', []))
+    return fields
+
+def empty_extraction_error(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """(error body, status) for a scan that found nothing: a 504 if it ran out of time, else a 500."""
+    if meta.get('partial'):
+        return {'error': EXTRACTION_TIME_BUDGET_ERROR, 'partial': True, 'timings': meta.get('timings', {})}, 504
+    return {'error': EXTRACTION_EMPTY_ERROR}, 500
+
+def extractor_busy_response() -> FlaskResponse:
+    resp = jsonify({'error': EXTRACTION_BUSY_ERROR})
+    resp.headers['Retry-After'] = '10'
+    return resp, 503
+
+def build_extraction_payload(url: str, options: Dict[str, Any], progress: Optional[ProgressCallback] = None) -> Tuple[Dict[str, Any], int]:
+    """Runs a scan and shapes it into the /extract JSON body. Returns (payload, status_code)."""
+    images, fonts, colors_data, meta = extract_assets_from_page(url, options, progress)
+
+    final_response = extraction_meta_fields(meta)
+    assets_found = False
+
+    if options.get('extract_images') and (image_list := sorted(list(images))):
+        if options.get('probe'):
+            image_info = meta.get('image_info') or {}
+            final_response['images'] = [dict(image_info.get(image_url, {}), url=image_url) for image_url in image_list]
+        else:
+            final_response['images'] = image_list
+        assets_found = True
+    if options.get('extract_fonts') and (font_list := sorted(fonts, key=lambda x: x.get('displayName', ''))):
+        final_response['fonts'] = font_list
+        assets_found = True
+    if options.get('extract_colors'):
+        if progress: progress('colors')
+        if color_palette := get_clustered_color_palette(colors_data):
+            final_response['colors'] = color_palette
+            assets_found = True
+
+    if any(options.get(k) for k in ['extract_images', 'extract_fonts', 'extract_colors']) and not assets_found:
+        return empty_extraction_error(meta)
+    return final_response, 200
+
+def describe_extraction_error(e: Exception) -> str:
+    if "net::ERR_NAME_NOT_RESOLVED" in str(e):
+        return 'The domain name could not be found. Please check the URL.'
+    return f'An unexpected server error occurred: {e}'
+
+class ExtractionJobQueue:
+    """Runs extraction scans on a bounded executor so web workers are not held for the whole scan.
+
+    Job state is written to small JSON files under the instance folder, so a status poll can be
+    answered by any gunicorn worker, not only the one running the job.
+    """
+
+    def __init__(self, jobs_dir: str, workers: int, max_pending: int, ttl: int):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._pending = 0
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='extraction-job')
+            self._pid, self._pending = os.getpid(), 0
+        return self._executor
+
+    def _write(self, state: Dict[str, Any], **changes: Any) -> None:
+        with self._lock:
+            state.update(changes, updated_at=time.time())
+            tmp_path = f"{self._path(state['id'])}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f: json.dump(state, f)
+            os.replace(tmp_path, self._path(state['id']))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not re.fullmatch(r'[a-f0-9]{32}', job_id): return None
+        try:
+            with open(self._path(job_id)) as f: return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff: os.remove(path)
+            except OSError:
+                continue
+
+    def submit(self, url: str, options: Dict[str, Any], user_id: Optional[int], runner: Callable[..., Tuple[Dict[str, Any], int]] = build_extraction_payload, tool_name: str = 'extractor') -> Optional[str]:
+        """Queues a scan and returns its job ID, or None when the queue is full.
+
+        runner is called as runner(url, options, progress) and returns (payload, status_code).
+        """
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending: return None
+            self._pending += 1
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        state: Dict[str, Any] = {'id': job_id, 'url': url, 'status': 'queued', 'phase': None, 'phases': [], 'created_at': time.time()}
+        self._write(state)
+        executor.submit(self._run, state, options, user_id, runner, tool_name)
+        return job_id
+
+    def _run(self, state: Dict[str, Any], options: Dict[str, Any], user_id: Optional[int], runner: Callable[..., Tuple[Dict[str, Any], int]], tool_name: str) -> None:
+        def progress(phase: Optional[str]) -> None:
+            self._write(state, phase=phase, phases=state['phases'] + ([state['phase']] if state['phase'] else []))
+
+        try:
+            self._write(state, status='running')
+            payload, status_code = runner(state['url'], options, progress)
+            if status_code == 200 and user_id is not None:
+                with app.app_context():
+                    db.session.add(ToolUsage(user_id=user_id, tool_name=tool_name, metadata_json=json.dumps({'url': state['url']})))
+                    db.session.add(UserActivityLog(user_id=user_id, action='tool_usage', details=tool_name))
+                    db.session.commit()
+            progress(None)
+            self._write(state, status='done' if status_code == 200 else 'failed', result=payload, http_status=status_code)
+        except Exception as e:
+            traceback.print_exc()
+            progress(None)
+            self._write(state, status='failed', result={'error': describe_extraction_error(e)}, http_status=500)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+EXTRACTION_JOBS = ExtractionJobQueue(EXTRACTION_JOBS_DIR, EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING_JOBS, EXTRACTION_JOB_TTL)
+# --- END: BACKGROUND EXTRACTION JOBS ---
+
+# --- START: STREAMING EXTRACTION RESPONSES ---
+def stream_extraction_records(url: str, options: Dict[str, Any]):
+    """Yields NDJSON lines for a scan: one record per result section as soon as it is ready, then a summary.
+
+    The scan runs on a helper thread so finished sections can be flushed to the client while the
+    rest of the pipeline is still working. Image records only carry URLs not sent before.
+    """
+    sections: queue.Queue = queue.Queue()
+    started = time.monotonic()
+
+    def run() -> None:
+        try:
+            sections.put(('done', extract_assets_from_page(url, options, on_section=lambda kind, value: sections.put((kind, value)))))
+        except Exception as e:
+            traceback.print_exc()
+            sections.put(('error', e))
+
+    threading.Thread(target=run, name='extraction-stream', daemon=True).start()
+    sent_images: Set[str] = set()
+    sent_image_keys: Set[str] = set()
+    dedupe = (options.get('dedupe') or IMAGE_DEDUPE_DEFAULT_MODE) != 'off'
+    sent_sections: Dict[str, Dict[str, Any]] = {}
+
+    def section_record(kind: str, value: Any) -> Optional[Dict[str, Any]]:
+        if not options.get(f'extract_{kind}'): return None
+        if kind == 'images':
+            new_images = set(value) - sent_images
+            if dedupe:
+                # Sections arrive before the final de-duplication, so skip variants of anything already sent.
+                new_images = {url for url in group_image_variants(new_images) if canonicalize_image_url(url)[0] not in sent_image_keys}
+                sent_image_keys.update(canonicalize_image_url(url)[0] for url in new_images)
+            sent_images.update(new_images)
+            return {'type': 'images', 'images': sorted(new_images)} if new_images else None
+        if kind in sent_sections: return None
+        if kind == 'fonts':
+            record = {'type': 'fonts', 'fonts': sorted(value, key=lambda x: x.get('displayName', ''))}
+        else:
+            record = {'type': 'colors', 'colors': get_clustered_color_palette(value)}
+        sent_sections[kind] = record
+        return record
+
+    while True:
+        kind, value = sections.get()
+        if kind == 'error':
+            yield json.dumps({'type': 'error', 'error': describe_extraction_error(value)}) + '\n'
+            return
+        if kind == 'done': break
+        if record := section_record(kind, value): yield json.dumps(record) + '\n'
+
+    # Cached and static results never report sections, so whatever is still unsent goes out now.
+    images, fonts, colors_data, meta = value
+    for kind, section in (('images', images), ('fonts', fonts), ('colors', colors_data)):
+        if record := section_record(kind, section): yield json.dumps(record) + '\n'
+
+    counts = {
+        'images': len(sent_images),
+        'fonts': len(sent_sections.get('fonts', {}).get('fonts', [])),
+        'colors': sum(len(group) for group in sent_sections.get('colors', {}).get('colors', {}).values()),
+    }
+    if any(options.get(k) for k in ['extract_images', 'extract_fonts', 'extract_colors']) and not any(counts.values()):
+        yield json.dumps({'type': 'error', 'error': empty_extraction_error(meta)[0]['error']}) + '\n'
+        return
+
+    if options.get('probe') and (image_info := meta.get('image_info')):
+        yield json.dumps({'type': 'image_info', 'images': [dict(info, url=image_url) for image_url, info in sorted(image_info.items())]}) + '\n'
+
+    track_usage('extractor', metadata={'url': url})
+    print(f"Streamed scan complete. Found {counts['images']} images, {counts['fonts']} fonts.")
+    summary: Dict[str, Any] = {'type': 'summary', **extraction_meta_fields(meta), 'counts': counts, 'elapsed_ms': round((time.monotonic() - started) * 1000)}
+    yield json.dumps(summary) + '\n'
+# --- END: STREAMING EXTRACTION RESPONSES ---
+
+# --- START: BATCH / SITE-CRAWL EXTRACTION ---
+BATCH_MAX_PAGES: int = int(os.environ.get('BATCH_MAX_PAGES', 25))
+BATCH_CONCURRENCY: int = int(os.environ.get('BATCH_CONCURRENCY', 4))
+BATCH_PER_DOMAIN_CONCURRENCY: int = int(os.environ.get('BATCH_PER_DOMAIN_CONCURRENCY', 2))
+BATCH_PER_DOMAIN_DELAY: float = float(os.environ.get('BATCH_PER_DOMAIN_DELAY', 0.5))
+BATCH_MAX_CRAWL_DEPTH: int = 3
+BATCH_MAX_SITEMAPS: int = 10
+SITEMAP_MAX_BYTES: int = 10 * 1024 * 1024
+BATCH_OPTION_KEYS: Set[str] = {'urls', 'start_url', 'depth', 'sitemap', 'sitemap_url', 'max_pages', 'async', 'stream'}
+CRAWL_SKIP_EXTENSIONS = re.compile(r'\.(?:jpe?g|png|gif|webp|avif|svg|ico|pdf|zip|gz|mp4|webm|mp3|css|js|json|xml|txt)$', re.IGNORECASE)
+
+class _DomainPoliteness:
+    """Caps how many pages of one host are fetched at once and spaces out their start times."""
+
+    def __init__(self, max_per_host: int, min_interval: float):
+        self.max_per_host = max(1, max_per_host)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = (urlparse(url).hostname or '').lower()
+        with self._lock:
+            semaphore = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start_at + self.min_interval
+            if start_at > now: time.sleep(start_at - now)
+            yield
+
+def _with_scheme(url: str) -> str:
+    url = url.strip()
+    return 'https://' + url if not url.startswith(('http://', 'https://')) else url
+
+def discover_sitemap_urls(sitemap_url: str, limit: int) -> List[str]:
+    """Reads page URLs from a sitemap, following sitemap indexes a few files deep."""
+    pending, seen_sitemaps, pages = [sitemap_url], set(), []
+    while pending and len(pages) < limit and len(seen_sitemaps) < BATCH_MAX_SITEMAPS:
+        if (current := pending.pop(0)) in seen_sitemaps: continue
+        seen_sitemaps.add(current)
+        try:
+            resp = OUTBOUND_HTTP.get(current, headers=STATIC_REQUEST_HEADERS, timeout=STATIC_FETCH_TIMEOUT, max_bytes=SITEMAP_MAX_BYTES)
+            resp.raise_for_status()
+            root = etree.fromstring(resp.content, etree.XMLParser(recover=True, resolve_entities=False, no_network=True))
+        except (requests.RequestException, etree.LxmlError) as e:
+            print(f"Could not read sitemap {current}: {e}")
+            continue
+        if root is None: continue
+        locs = [el.text.strip() for el in root.iter('{*}loc') if el.text and el.text.strip()]
+        if etree.QName(root).localname == 'sitemapindex': pending.extend(locs)
+        else: pages.extend(locs)
+    return pages[:limit]
+
+def crawl_site_urls(start_url: str, depth: int, limit: int, politeness: _DomainPoliteness) -> List[str]:
+    """Breadth-first crawl of same-host links over plain HTTP fetches. Returns start_url plus what it found."""
+    host = (urlparse(start_url).hostname or '').lower()
+    found, seen = [start_url], {normalize_extraction_url(start_url)}
+
+    def page_links(page_url: str) -> Set[str]:
+        with politeness.slot(page_url):
+            try:
+                final_url, html = fetch_static_html(page_url)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Crawl could not fetch {page_url}: {e}")
+                return set()
+        return scan_html_assets(html, final_url)['links']
+
+    frontier = [start_url]
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch-crawl') as executor:
+        for _ in range(depth):
+            next_frontier: List[str] = []
+            for links in executor.map(page_links, frontier):
+                for link in sorted(links):
+                    parsed = urlparse(link)
+                    if parsed.scheme not in ('http', 'https') or (parsed.hostname or '').lower() != host: continue
+                    if CRAWL_SKIP_EXTENSIONS.search(parsed.path) or (key := normalize_extraction_url(link)) in seen: continue
+                    seen.add(key)
+                    found.append(link)
+                    next_frontier.append(link)
+                    if len(found) >= limit: return found
+            if not (frontier := next_frontier): break
+    return found
+
+def resolve_batch_targets(options: Dict[str, Any], politeness: _DomainPoliteness) -> Tuple[List[str], int]:
+    """Turns a batch request into the list of pages to scan. Returns (pages, number discovered before capping)."""
+    limit = max(1, min(int(options.get('max_pages') or BATCH_MAX_PAGES), BATCH_MAX_PAGES))
+    if isinstance(urls := options.get('urls'), list):
+        candidates = [_with_scheme(u) for u in urls if isinstance(u, str) and u.strip()]
+    elif start_url := options.get('start_url'):
+        start_url = _with_scheme(start_url)
+        if sitemap_url := options.get('sitemap_url') or (options.get('sitemap') and urljoin(start_url, '/sitemap.xml')):
+            # Read one past the cap so the report can say whether the sitemap was truncated.
+            candidates = discover_sitemap_urls(_with_scheme(sitemap_url), limit + 1)
+        else:
+            depth = max(0, min(int(options.get('depth') or 0), BATCH_MAX_CRAWL_DEPTH))
+            candidates = crawl_site_urls(start_url, depth, limit + 1, politeness)
+    else:
+        candidates = []
+
+    pages, seen = [], set()
+    for candidate in candidates:
+        if (key := normalize_extraction_url(candidate)) not in seen:
+            seen.add(key)
+            pages.append(candidate)
+    return pages[:limit], len(pages)
+
+def find_palette_color_pages(palette: Dict[str, List[str]], page_colors: Dict[str, Dict[str, float]], threshold: float = PALETTE_DELTA_E) -> Dict[str, List[str]]:
+    """Maps each palette swatch to the pages that painted a colour within ``threshold`` of it."""
+    swatches = [swatch for group in palette.values() for swatch in group]
+    if not swatches: return {}
+    swatch_lab = srgb_codes_to_lab(np.array([int(swatch[1:], 16) for swatch in swatches], dtype=np.int64))
+    color_pages: Dict[str, List[str]] = {swatch: [] for swatch in swatches}
+    for page_url, colors in page_colors.items():
+        codes, _ = parse_css_colors(colors)
+        if not codes.size: continue
+        diff = swatch_lab[:, None, :] - srgb_codes_to_lab(codes)[None, :, :]
+        near = (np.einsum('ijk,ijk->ij', diff, diff) < threshold ** 2).any(axis=1)
+        for swatch, hit in zip(swatches, near):
+            if hit: color_pages[swatch].append(page_url)
+    return color_pages
+
+def build_batch_payload(label: str, options: Dict[str, Any], progress: Optional[ProgressCallback] = None) -> Tuple[Dict[str, Any], int]:
+    """Scans every page of a batch request concurrently and merges the results into one report.
+
+    Scans share the browser pool, so at most BROWSER_POOL_SIZE pages render at once; cached and
+    static scans fill the rest of the BATCH_CONCURRENCY slots. Returns (payload, status_code).
+    """
+    report = progress or (lambda phase: None)
+    politeness = _DomainPoliteness(BATCH_PER_DOMAIN_CONCURRENCY, BATCH_PER_DOMAIN_DELAY)
+    report('discovering')
+    targets, discovered = resolve_batch_targets(options, politeness)
+    if not targets:
+        return {'error': 'No pages to scan were found.'}, 400
+
+    page_options = {k: v for k, v in options.items() if k not in BATCH_OPTION_KEYS}
+    results: Dict[str, ExtractionResult] = {}
+    errors: Dict[str, str] = {}
+
+    def scan(page_url: str) -> ExtractionResult:
+        with politeness.slot(page_url):
+            return extract_assets_from_page(page_url, page_options)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(targets))), thread_name_prefix='batch-scan') as executor:
+        futures = {executor.submit(scan, page_url): page_url for page_url in targets}
+        for finished, future in enumerate(as_completed(futures), 1):
+            page_url = futures[future]
+            try:
+                results[page_url] = future.result()
+            except Exception as e:
+                print(f"Batch scan of {page_url} failed: {e}")
+                errors[page_url] = describe_extraction_error(e)
+            report(f'scanned {finished}/{len(targets)}')
+
+    image_pages: Dict[str, List[str]] = {}
+    image_info: Dict[str, Dict[str, Any]] = {}
+    font_entries: Dict[str, Dict[str, Any]] = {}
+    color_totals: Dict[str, float] = {}
+    page_colors: Dict[str, Dict[str, float]] = {}
+    pages_report: List[Dict[str, Any]] = []
+    for page_url in targets:
+        if page_url in errors:
+            pages_report.append({'url': page_url, 'status': 'failed', 'error': errors[page_url]})
+            continue
+        images, fonts, colors, meta = results[page_url]
+        for image_url in images: image_pages.setdefault(image_url, []).append(page_url)
+        image_info.update(meta.get('image_info') or {})
+        for font in fonts: font_entries.setdefault(font.get('displayName', ''), dict(font, pages=[]))['pages'].append(page_url)
+        for color, score in colors.items(): color_totals[color] = color_totals.get(color, 0.0) + score
+        page_colors[page_url] = colors
+        pages_report.append({'url': page_url, 'status': 'done', 'source': meta.get('source', 'browser'), 'cached': bool(meta.get('cached')),
+                             'partial': bool(meta.get('partial')), 'counts': {'images': len(images), 'fonts': len(fonts), 'colors': len(colors)}})
+
+    if not results:
+        return {'error': 'None of the pages could be scanned.', 'pages': pages_report}, 500
+
+    if (options.get('dedupe') or IMAGE_DEDUPE_DEFAULT_MODE) != 'off':
+        # Pages often embed the same picture at different CDN sizes; report it once with every page it appeared on.
+        image_pages = {kept: sorted({page for variant in variants for page in image_pages[variant]}, key=targets.index)
+                       for kept, variants in group_image_variants(set(image_pages)).items()}
+
+    payload: Dict[str, Any] = {'pages': pages_report, 'discovered': discovered, 'truncated': discovered > len(targets)}
+    if options.get('extract_images'):
+        payload['images'] = [dict(image_info.get(image_url, {}), url=image_url, pages=pages) for image_url, pages in sorted(image_pages.items())]
+    if options.get('extract_fonts'):
+        payload['fonts'] = sorted(font_entries.values(), key=lambda x: x.get('displayName', ''))
+    if options.get('extract_colors') and (palette := get_clustered_color_palette(color_totals)):
+        payload['colors'] = palette
+        payload['color_pages'] = find_palette_color_pages(palette, page_colors)
+    return payload, 200
+# --- END: BATCH / SITE-CRAWL EXTRACTION ---
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -969,21 +2837,68 @@ def subscribe():
         
     return redirect(request.referrer or url_for('home'))
 
+GOOGLE_FONTS_API_FIELDS: Tuple[str, ...] = ('family', 'category', 'variants', 'rank')
+GOOGLE_FONTS_API_DEFAULT_LIMIT: int = 100
+GOOGLE_FONTS_API_MAX_LIMIT: int = 2000
+GOOGLE_FONTS_API_MAX_AGE: int = 3600
+GOOGLE_FONTS_RESPONSE_CACHE: TTLCache = TTLCache(maxsize=128, ttl=GOOGLE_FONTS_API_MAX_AGE)
+GOOGLE_FONTS_RESPONSE_CACHE_LOCK = threading.Lock()
+
+def _csv_arg(name: str) -> List[str]:
+    return [v.strip().lower() for v in request.args.get(name, '').split(',') if v.strip()]
+
+def filter_google_fonts(fonts: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int, int, int]:
+    """Applies the request's category/variants/q/max_rank filters and paging. Returns (page, total, offset, limit)."""
+    categories, variants, prefix = set(_csv_arg('category')), set(_csv_arg('variants')), request.args.get('q', '').strip().lower()
+    max_rank = request.args.get('max_rank', type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', GOOGLE_FONTS_API_DEFAULT_LIMIT, type=int), 1), GOOGLE_FONTS_API_MAX_LIMIT)
+    fields = [f for f in _csv_arg('fields') if f in GOOGLE_FONTS_API_FIELDS] or list(GOOGLE_FONTS_API_FIELDS)
+    matches = [font for font in fonts
+               if (not categories or font.get('category') in categories)
+               and (not max_rank or font['rank'] <= max_rank)
+               and (not prefix or font['family'].lower().startswith(prefix))
+               and variants.issubset(font.get('variants', ()))]
+    page = [{field: font.get(field) for field in fields} for font in matches[offset:offset + limit]]
+    return page, len(matches), offset, limit
+
 @app.route('/api/google-fonts')
 @csrf.exempt
 def get_google_fonts():
+    """The Google Fonts catalog from the local snapshot, filtered and paged server-side.
+
+    Query args: category, variants (comma lists; a font needs all listed variants), q (family prefix),
+    max_rank (popularity cut-off), offset, limit and fields. Responses are gzipped when the client
+    accepts it and carry an ETag tied to the snapshot and the query.
+    """
     if not check_and_increment_usage():
         return jsonify({'error': 'Usage limit reached. Please create an account to continue.'}), 403
 
-    api_key = os.getenv('GOOGLE_FONTS_API_KEY')
-    if not api_key: return jsonify({'error': 'Google Fonts API key is not configured on the server.'}), 500
-    api_url = f"https://www.googleapis.com/webfonts/v1/webfonts?key={api_key}&sort=popularity"
-    try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status() 
-        return Response(response.content, content_type=response.headers['Content-Type'])
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Failed to fetch font data: {e}'}), 502
+    snapshot = GOOGLE_FONTS_CATALOG.snapshot()
+    if not snapshot.get('fonts'):
+        if not os.getenv('GOOGLE_FONTS_API_KEY'): return jsonify({'error': 'Google Fonts API key is not configured on the server.'}), 500
+        return jsonify({'error': 'The font catalog is not available yet. Please try again shortly.'}), 503
+
+    use_gzip = 'gzip' in request.accept_encodings
+    query = urlencode(sorted(request.args.items(multi=True)))
+    etag = hashlib.sha1(f"{snapshot.get('fetched_at')}|{query}".encode()).hexdigest() + ('-gz' if use_gzip else '')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        with GOOGLE_FONTS_RESPONSE_CACHE_LOCK:
+            body = GOOGLE_FONTS_RESPONSE_CACHE.get(etag)
+        if body is None:
+            page, total, offset, limit = filter_google_fonts(snapshot['fonts'])
+            body = json.dumps({'items': page, 'total': total, 'offset': offset, 'limit': limit}, separators=(',', ':')).encode()
+            if use_gzip: body = gzip.compress(body, compresslevel=6)
+            with GOOGLE_FONTS_RESPONSE_CACHE_LOCK:
+                GOOGLE_FONTS_RESPONSE_CACHE[etag] = body
+        response = Response(body, mimetype='application/json')
+        if use_gzip: response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public, response.cache_control.max_age = True, GOOGLE_FONTS_API_MAX_AGE
+    return response
 
 @app.route('/extract', methods=['POST'])
 @csrf.exempt
@@ -996,25 +2911,24 @@ def handle_extraction_request() -> FlaskResponse:
         return jsonify({'error': 'URL is required'}), 400
     
     url = 'https://' + url if not url.startswith(('http://', 'https://')) else url
+
+    if options.get('async'):
+        user_id = current_user.id if current_user.is_authenticated else None
+        if not (job_id := EXTRACTION_JOBS.submit(url, options, user_id)):
+            return extractor_busy_response()
+        return jsonify({
+            'job_id': job_id,
+            'status_url': url_for('extraction_job_status', job_id=job_id),
+            'events_url': url_for('extraction_job_events', job_id=job_id),
+        }), 202
+
+    if options.get('stream'):
+        return Response(stream_with_context(stream_extraction_records(url, options)), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
     try:
-        images, fonts, colors_data = extract_assets_from_page(url, options)
-        
-        final_response: Dict[str, Any] = {}
-        assets_found = False
-        
-        if options.get('extract_images') and (image_list := sorted(list(images))):
-            final_response['images'] = image_list
-            assets_found = True
-        if options.get('extract_fonts') and (font_list := sorted(fonts, key=lambda x: x.get('displayName', ''))):
-            final_response['fonts'] = font_list
-            assets_found = True
-        if options.get('extract_colors') and (color_palette := get_clustered_color_palette(colors_data)):
-            final_response['colors'] = color_palette
-            assets_found = True
-
-        if any(options.get(k) for k in ['extract_images', 'extract_fonts', 'extract_colors']) and not assets_found:
-            return jsonify({'error': 'Could not extract any assets. The site may be protected or empty.'}), 500
+        final_response, status_code = build_extraction_payload(url, options)
+        if status_code != 200:
+            return jsonify(final_response), status_code
         
         track_usage('extractor', metadata={'url': url})
         print(f"Scan Complete. Found {len(final_response.get('images', []))} images, {len(final_response.get('fonts', []))} fonts.")
@@ -1022,77 +2936,129 @@ def handle_extraction_request() -> FlaskResponse:
     
     except Exception as e:
         traceback.print_exc()
-        error_message = str(e)
-        if "net::ERR_NAME_NOT_RESOLVED" in error_message:
-            return jsonify({'error': 'The domain name could not be found. Please check the URL.'}), 500
-        return jsonify({'error': f'An unexpected server error occurred: {e}'}), 500
-
-# --- START: NEW HELPER FUNCTION FOR PILLOW FALLBACK
-def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float, original_size: int) -> Optional[bytes]:
-    """Fallback compression using Pillow if external tools are missing."""
-    try:
-        img_buffer = io.BytesIO(image_bytes)
-        img = Image.open(img_buffer)
+        return jsonify({'error': describe_extraction_error(e)}), 500
 
-        # Ensure image is in a compatible mode
-        if img.mode in ('P', 'PA'):
-            img = img.convert('RGBA' if file_ext == '.png' else 'RGB')
-        elif img.mode not in ('RGB', 'RGBA', 'L'):
-             img = img.convert('RGB')
-
-        output_buffer = io.BytesIO()
-
-        if file_ext in ['.jpg', '.jpeg']:
-            best_bytes = None
-            # Try a range of qualities to meet the target
-            for quality in range(85, 39, -5): # Lowered the minimum quality to 40
-                output_buffer.seek(0)
-                output_buffer.truncate(0)
-                img.save(output_buffer, format='JPEG', quality=quality, optimize=True)
-                current_bytes = output_buffer.getvalue()
-                # If we hit the target size, we're done
-                if len(current_bytes) <= target_size:
-                    best_bytes = current_bytes
-                    break
-                # Otherwise, keep the smallest result so far
-                if best_bytes is None or len(current_bytes) < len(best_bytes):
-                    best_bytes = current_bytes
-            return best_bytes
-
-        elif file_ext == '.png':
-            # --- START: ADVANCED PNG FALLBACK ---
-            # This is a powerful technique that significantly reduces PNG size
-            # by reducing the number of colors, similar to pngquant.
-            quantized_img = img.quantize(colors=256, method=Image.Quantize.LIBIMAGEQUANT)
-            quantized_buffer = io.BytesIO()
-            # We save and then read back to get the final compressed size
-            quantized_img.save(quantized_buffer, format='PNG', optimize=True)
-            quantized_bytes = quantized_buffer.getvalue()
-
-            # For comparison, also run the basic optimization
-            basic_buffer = io.BytesIO()
-            img.save(basic_buffer, format='PNG', optimize=True)
-            basic_bytes = basic_buffer.getvalue()
-
-            # Return whichever result is smaller
-            if len(quantized_bytes) < len(basic_bytes):
-                app.logger.info("Pillow fallback: Quantization was more effective.")
-                return quantized_bytes
-            else:
-                app.logger.info("Pillow fallback: Basic optimization was more effective.")
-                return basic_bytes
-            # --- END: ADVANCED PNG FALLBACK ---
-
-        return None
-    except Exception as e:
-        app.logger.error(f"Pillow fallback compression failed: {e}")
-        return image_bytes
-# --- END: NEW HELPER FUNCTION FOR PILLOW FALLBACK
-
-
-# --- START: NEW HELPER FUNCTION FOR PILLOW FALLBACK
-def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float, original_size: int) -> Optional[bytes]:
-    """Fallback compression using Pillow if external tools are missing."""
+@app.route('/extract/batch', methods=['POST'])
+@csrf.exempt
+@login_required
+def handle_batch_extraction_request() -> FlaskResponse:
+    options = request.get_json()
+    if not options or not (options.get('urls') or options.get('start_url')):
+        return jsonify({'error': 'A list of urls or a start_url is required'}), 400
+    if options.get('urls') is not None and not isinstance(options['urls'], list):
+        return jsonify({'error': 'urls must be a list'}), 400
+
+    label = _with_scheme(options.get('start_url') or next((u for u in options['urls'] if isinstance(u, str) and u.strip()), ''))
+    if not (job_id := EXTRACTION_JOBS.submit(label, options, current_user.id, runner=build_batch_payload, tool_name='extractor_batch')):
+        return extractor_busy_response()
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('extraction_job_status', job_id=job_id),
+        'events_url': url_for('extraction_job_events', job_id=job_id),
+    }), 202
+
+@app.route('/extract/<job_id>')
+def extraction_job_status(job_id: str) -> FlaskResponse:
+    if not (job := EXTRACTION_JOBS.get(job_id)):
+        return jsonify({'error': 'Unknown or expired job.'}), 404
+    return jsonify(job)
+
+@app.route('/extract/<job_id>/events')
+def extraction_job_events(job_id: str) -> FlaskResponse:
+    """Server-sent job updates, in streams capped at EXTRACTION_EVENTS_MAX_STREAM seconds.
+
+    Each event's id is the job's updated_at, so a reconnecting EventSource (which sends it back as
+    Last-Event-ID) only receives newer updates. Once the client has seen the final state, the reply is
+    a 204, which tells the browser to stop reconnecting.
+    """
+    if not (job := EXTRACTION_JOBS.get(job_id)):
+        return jsonify({'error': 'Unknown or expired job.'}), 404
+    last_event_id = request.headers.get('Last-Event-ID')
+    if job['status'] in ('done', 'failed') and last_event_id == str(job.get('updated_at')):
+        return '', 204
+
+    def event_stream():
+        last_update, stream_deadline = last_event_id, time.monotonic() + EXTRACTION_EVENTS_MAX_STREAM
+        yield f"retry: {EXTRACTION_EVENTS_RETRY_MS}\n\n"
+        while (job := EXTRACTION_JOBS.get(job_id)) is not None:
+            if (update := str(job.get('updated_at'))) != last_update:
+                last_update = update
+                yield f"id: {update}\nevent: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            if job['status'] in ('done', 'failed') or time.monotonic() >= stream_deadline: return
+            time.sleep(0.5)
+
+    return Response(event_stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- START: JPEG TARGET-SIZE SEARCH ---
+JPEG_MIN_QUALITY: int = 40
+JPEG_MAX_QUALITY: int = 90
+JPEG_TARGET_TOLERANCE: float = 0.05
+JPEG_PROBE_MAX_SIDE: int = 512
+JPEG_MAX_ENCODES: int = 6
+
+def _pillow_jpeg_encoder(img: Image.Image) -> Callable[[int], bytes]:
+    def encode(quality: int) -> bytes:
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        return buffer.getvalue()
+    return encode
+
+def jpeg_probe_encoder(image_bytes: bytes) -> Callable[[int], int]:
+    """quality -> encoded size of a downscaled copy of the image (decoded in draft mode), memoised.
+
+    A probe encode costs a small fraction of a full one and its size tracks the full encode's size
+    across qualities up to a roughly constant factor, which is what the search below relies on.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft('RGB', (JPEG_PROBE_MAX_SIDE, JPEG_PROBE_MAX_SIDE))
+        probe = img.convert('RGB')
+    probe.thumbnail((JPEG_PROBE_MAX_SIDE, JPEG_PROBE_MAX_SIDE))
+    encode = _pillow_jpeg_encoder(probe)
+    return lru_cache(maxsize=None)(lambda quality: len(encode(quality)))
+
+def search_jpeg_quality(encode: Callable[[int], bytes], target_size: float, probe: Callable[[int], int]) -> Tuple[bytes, int, int]:
+    """Binary-searches the highest quality whose full encode fits target_size. Returns (bytes, quality, encodes).
+
+    Instead of the bracket midpoint, each step tries the quality the probe predicts will just fit,
+    found by bisecting over the cheap probe encodes. The prediction is calibrated by the full encodes
+    so far: the full/probe size ratio is interpolated in log space between the two nearest measured
+    qualities. The search stops once a result is within JPEG_TARGET_TOLERANCE under the target; if even
+    the lowest quality is too big, the smallest encode is returned.
+    """
+    lo, hi = JPEG_MIN_QUALITY, JPEG_MAX_QUALITY
+    quality = (lo + hi) // 2
+    best: Optional[Tuple[bytes, int]] = None
+    smallest: Optional[Tuple[bytes, int]] = None
+    log_ratios: Dict[int, float] = {}
+    encodes = 0
+
+    def predicted_size(q: int) -> float:
+        (q1, r1), *rest = sorted(log_ratios.items(), key=lambda item: abs(item[0] - q))[:2]
+        log_ratio = r1 + (rest[0][1] - r1) * (q - q1) / (rest[0][0] - q1) if rest else r1
+        return probe(q) * math.exp(log_ratio)
+
+    while lo <= hi and encodes < JPEG_MAX_ENCODES:
+        data = encode(quality)
+        encodes += 1
+        if len(data) <= target_size:
+            if best is None or quality > best[1]: best = (data, quality)
+            if len(data) >= target_size * (1 - JPEG_TARGET_TOLERANCE): break
+            lo = quality + 1
+        else:
+            if smallest is None or len(data) < len(smallest[0]): smallest = (data, quality)
+            hi = quality - 1
+        log_ratios[quality] = math.log(len(data) / max(probe(quality), 1))
+        predict_lo, predict_hi, quality = lo, hi, lo
+        while predict_lo <= predict_hi:
+            mid = (predict_lo + predict_hi) // 2
+            if predicted_size(mid) <= target_size: quality, predict_lo = mid, mid + 1
+            else: predict_hi = mid - 1
+    data, quality = best or smallest
+    return data, quality, encodes
+# --- END: JPEG TARGET-SIZE SEARCH ---
+
+def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float, original_size: int) -> Tuple[Optional[bytes], int]:
+    """Fallback compression using Pillow if external tools are missing. Returns (bytes, encodes)."""
     try:
         img_buffer = io.BytesIO(image_bytes)
         img = Image.open(img_buffer)
@@ -1102,21 +3068,10 @@ def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float,
         elif img.mode not in ('RGB', 'RGBA', 'L'):
              img = img.convert('RGB')
 
-        output_buffer = io.BytesIO()
-
         if file_ext in ['.jpg', '.jpeg']:
-            best_bytes = None
-            for quality in range(85, 39, -5):
-                output_buffer.seek(0)
-                output_buffer.truncate(0)
-                img.save(output_buffer, format='JPEG', quality=quality, optimize=True)
-                current_bytes = output_buffer.getvalue()
-                if len(current_bytes) <= target_size:
-                    best_bytes = current_bytes
-                    break
-                if best_bytes is None or len(current_bytes) < len(best_bytes):
-                    best_bytes = current_bytes
-            return best_bytes
+            data, quality, encodes = search_jpeg_quality(_pillow_jpeg_encoder(img), target_size, jpeg_probe_encoder(image_bytes))
+            app.logger.info(f"Pillow fallback: JPEG quality {quality} after {encodes} encodes.")
+            return data, encodes
 
         elif file_ext == '.png':
             # --- START: INTELLIGENT PNG FALLBACK (QUALITY FOCUSED) ---
@@ -1129,7 +3084,7 @@ def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float,
                     img = img.convert('RGB')
                 jpeg_buffer = io.BytesIO()
                 img.save(jpeg_buffer, format='JPEG', quality=85, optimize=True)
-                return jpeg_buffer.getvalue()
+                return jpeg_buffer.getvalue(), 1
             
             # If it has transparency, it's likely a graphic. Use quantization but with higher quality settings.
             else:
@@ -1137,17 +3092,215 @@ def _compress_with_pillow(image_bytes: bytes, file_ext: str, target_size: float,
                 quantized_img = img.quantize(colors=256, method=Image.Quantize.LIBIMAGEQUANT)
                 quantized_buffer = io.BytesIO()
                 quantized_img.save(quantized_buffer, format='PNG', optimize=True)
-                return quantized_buffer.getvalue()
+                return quantized_buffer.getvalue(), 1
             # --- END: INTELLIGENT PNG FALLBACK ---
 
-        return None
+        return None, 0
+    except (CompressionLimitExceeded, MemoryError):
+        raise
     except Exception as e:
         app.logger.error(f"Pillow fallback compression failed: {e}")
-        return image_bytes
-# --- END: NEW HELPER FUNCTION FOR PILLOW FALLBACK
+        return image_bytes, 0
+
+
+# --- START: COMPRESSION WORKER POOL ---
+# Every web worker owns a pool, so the machine's cores are split between them. WEB_CONCURRENCY is the
+# worker count gunicorn itself reads; set COMPRESSION_WORKERS directly when workers are configured elsewhere.
+COMPRESSION_WEB_WORKERS: int = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+COMPRESSION_WORKERS: int = int(os.environ.get('COMPRESSION_WORKERS', max(1, (os.cpu_count() or 2) // COMPRESSION_WEB_WORKERS)))
+COMPRESSION_MAX_PENDING: int = int(os.environ.get('COMPRESSION_MAX_PENDING', COMPRESSION_WORKERS * 2))
+COMPRESSION_JOB_CPU_SECONDS: int = int(os.environ.get('COMPRESSION_JOB_CPU_SECONDS', 30))
+COMPRESSION_JOB_MEMORY_MB: int = int(os.environ.get('COMPRESSION_JOB_MEMORY_MB', 2048))
+COMPRESSION_JOB_TIMEOUT: int = int(os.environ.get('COMPRESSION_JOB_TIMEOUT', 60))
+# How long an admitted job may wait for a free process before the request gives up with a 503.
+COMPRESSION_QUEUE_TIMEOUT: float = float(os.environ.get('COMPRESSION_QUEUE_TIMEOUT', 10))
+COMPRESSION_EXTENSIONS: Set[str] = {'.jpg', '.jpeg', '.png'}
+# Tools are fed through stdin/stdout. Builds that cannot do that (e.g. an oxipng too old to read '-')
+# can be listed here to run against files in a RAM-backed scratch dir instead.
+COMPRESSION_FILE_ONLY_TOOLS: Set[str] = {t.strip() for t in os.environ.get('COMPRESSION_FILE_ONLY_TOOLS', '').split(',') if t.strip()}
+COMPRESSION_SCRATCH_DIR: Optional[str] = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+
+class CompressionToolError(RuntimeError):
+    """An external compressor exited with an error."""
+
+class CompressionLimitExceeded(RuntimeError):
+    """A compression job ran past its CPU-time or memory allowance."""
+
+def _raise_cpu_limit(signum, frame):
+    raise CompressionLimitExceeded(f"Compression used more than {COMPRESSION_JOB_CPU_SECONDS}s of CPU time")
+
+def _init_compression_worker() -> None:
+    """Runs once in each pool process: caps its address space and turns SIGXCPU into an exception."""
+    if resource is None: return
+    limit = COMPRESSION_JOB_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+
+@contextmanager
+def _cpu_time_allowance(seconds: int):
+    """Sets the soft CPU-time limit to `seconds` past what this process has already used."""
+    if resource is None:
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + seconds, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+def _limit_tool_process() -> None:
+    resource.setrlimit(resource.RLIMIT_CPU, (COMPRESSION_JOB_CPU_SECONDS, COMPRESSION_JOB_CPU_SECONDS))
+
+def _run_compression_tool(tool_path: str, pipe_args: List[str], file_args: List[str], data: bytes, check: bool = True) -> Optional[bytes]:
+    """Runs a compressor over `data` and returns its output, or None when it declined (non-zero exit, check=False).
+
+    pipe_args make the tool read stdin and write stdout. Tools listed in COMPRESSION_FILE_ONLY_TOOLS get
+    file_args instead, with '{in}' and '{out}' replaced by paths in COMPRESSION_SCRATCH_DIR.
+    """
+    name = os.path.basename(tool_path)
+    scratch = None
+    if name in COMPRESSION_FILE_ONLY_TOOLS:
+        scratch = tempfile.TemporaryDirectory(dir=COMPRESSION_SCRATCH_DIR)
+        in_path, out_path = os.path.join(scratch.name, 'in'), os.path.join(scratch.name, 'out')
+        with open(in_path, 'wb') as f: f.write(data)
+        cmd, stdin_data = [tool_path] + [a.replace('{in}', in_path).replace('{out}', out_path) for a in file_args], None
+    else:
+        cmd, stdin_data = [tool_path] + pipe_args, data
+    app.logger.info(f"Running {name} command: {' '.join(cmd)}")
+    try:
+        result = subprocess.run(cmd, input=stdin_data, capture_output=True, timeout=COMPRESSION_JOB_TIMEOUT, preexec_fn=_limit_tool_process if resource else None)
+        if result.stderr: app.logger.info(f"{name} stderr: {result.stderr.decode(errors='replace')}")
+        if result.returncode != 0:
+            if check: raise CompressionToolError(f"{name} exited with {result.returncode}: {result.stderr.decode(errors='replace')}")
+            return None
+        if scratch is None: return result.stdout
+        with open(out_path, 'rb') as f: return f.read()
+    except subprocess.TimeoutExpired:
+        raise CompressionLimitExceeded(f"{name} ran longer than {COMPRESSION_JOB_TIMEOUT}s")
+    finally:
+        if scratch is not None: scratch.cleanup()
+
+def run_compression_job(original_bytes: bytes, ext: str, target_reduction: int) -> Dict[str, Any]:
+    """Compresses one JPG or PNG. Runs in a compression pool process, so it must stay a picklable top-level function.
+
+    Returns {'bytes', 'mimetype', 'ext', 'method', 'encodes'}.
+    """
+    with _cpu_time_allowance(COMPRESSION_JOB_CPU_SECONDS):
+        original_size = len(original_bytes)
+        target_size = original_size * (1 - (target_reduction / 100))
+        mozjpeg_path = "/usr/bin/mozjpeg" if os.path.exists("/usr/bin/mozjpeg") else None
+        pngquant_path = "/usr/bin/pngquant" if os.path.exists("/usr/bin/pngquant") else None
+        oxipng_path = "/usr/bin/oxipng" if os.path.exists("/usr/bin/oxipng") else None
+        app.logger.info(f"Tool paths found: mozjpeg='{mozjpeg_path}', pngquant='{pngquant_path}', oxipng='{oxipng_path}'")
+
+        if ext in ['.jpg', '.jpeg']:
+            if not mozjpeg_path:
+                app.logger.warning("mozjpeg not found. Falling back to Pillow for JPG.")
+                compressed, encodes = _compress_with_pillow(original_bytes, ext, target_size, original_size)
+                return {'bytes': compressed, 'mimetype': 'image/jpeg', 'ext': 'jpg', 'method': 'pillow_fallback', 'encodes': encodes}
+            def encode(quality: int) -> bytes:
+                args = ["-quality", str(quality)]
+                return _run_compression_tool(mozjpeg_path, args, args + ["-outfile", "{out}", "{in}"], original_bytes)
+            compressed, quality, encodes = search_jpeg_quality(encode, target_size, jpeg_probe_encoder(original_bytes))
+            app.logger.info(f"mozjpeg: quality {quality} after {encodes} encodes.")
+            return {'bytes': compressed, 'mimetype': 'image/jpeg', 'ext': 'jpg', 'method': 'mozjpeg', 'encodes': encodes}
+
+        img = Image.open(io.BytesIO(original_bytes))
+        has_transparency = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        app.logger.info(f"PNG detected. Mode: {img.mode}, Has transparency: {has_transparency}")
+        if not has_transparency and mozjpeg_path:
+            app.logger.info("Non-transparent PNG detected. Converting to high-quality JPG for maximum efficiency.")
+            output_buffer = io.BytesIO()
+            img.convert('RGB').save(output_buffer, format='JPEG', quality=85, optimize=True)
+            return {'bytes': output_buffer.getvalue(), 'mimetype': 'image/jpeg', 'ext': 'jpg', 'method': 'png_to_jpg_conversion', 'encodes': 1}
+
+        app.logger.info("Graphic or transparent PNG detected. Applying PNG optimization pipeline.")
+        current, methods_used = original_bytes, []
+        if pngquant_path:
+            # Map the slider (0-90) to a safe quality range (98 down to 65) so quantization never wrecks the image.
+            quality_args = ['--skip-if-larger', f'--quality={max(65, 100 - target_reduction)}-98', '--speed', '1', '--strip']
+            quantized = _run_compression_tool(pngquant_path, quality_args + ['-'], quality_args + ['--force', '--output', '{out}', '{in}'], current, check=False)
+            if quantized and len(quantized) < len(current):
+                current = quantized
+                methods_used.append("pngquant")
+            else:
+                app.logger.warning("pngquant did not produce a smaller file or failed.")
+        if oxipng_path:
+            oxipng_args = ["-o", "4", "-s", "--strip", "safe", "-a", "-Z"]
+            current = _run_compression_tool(oxipng_path, oxipng_args + ["--stdout", "-"], oxipng_args + ["--out", "{out}", "{in}"], current)
+            methods_used.append("oxipng")
+        if not methods_used:
+            app.logger.warning("No external PNG tools used. Falling back to Pillow.")
+            compressed, encodes = _compress_with_pillow(original_bytes, ext, target_size, original_size)
+            return {'bytes': compressed, 'mimetype': 'image/png', 'ext': 'png', 'method': 'pillow_fallback', 'encodes': encodes}
+        return {'bytes': current, 'mimetype': 'image/png', 'ext': 'png', 'method': "+".join(methods_used), 'encodes': len(methods_used)}
+
+class CompressionPool:
+    """A bounded process pool for compression jobs, so web workers only do I/O.
+
+    Each web worker process owns one pool (created lazily, after gunicorn forks) sized to its share of
+    the cores. submit() refuses new jobs once COMPRESSION_MAX_PENDING are queued or running, and a pool
+    whose process died is replaced.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._pending = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            # forkserver/spawn rather than fork: forking a threaded web worker can deadlock the child.
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_compression_worker)
+            if self._pid != os.getpid(): self._pid, self._pending = os.getpid(), 0
+        return self._executor
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Optional[Future]:
+        """Queues fn(*args) in the pool, or returns None when it is saturated."""
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending: return None
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._executor = None
+                future = self._get_executor().submit(fn, *args)
+            self._pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    @staticmethod
+    def wait_until_started(future: Future, timeout: float) -> bool:
+        """Waits up to `timeout` for a queued job to leave the queue. Returns False, cancelling it, if it never did.
+
+        The executor marks a job running once it is handed to its call queue, at most one job ahead of a free process.
+        """
+        deadline = time.monotonic() + timeout
+        while not (future.running() or future.done()):
+            if time.monotonic() >= deadline and future.cancel(): return False
+            time.sleep(0.05)
+        return True
+
+    def reset(self) -> None:
+        """Drops the pool (e.g. after a worker died); the next submit starts a fresh one."""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid(): self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
+COMPRESSION_POOL = CompressionPool(COMPRESSION_WORKERS, COMPRESSION_MAX_PENDING)
+atexit.register(COMPRESSION_POOL.reset)
+# --- END: COMPRESSION WORKER POOL ---
 
-# START: DEBUGLOGGING FOR COMPRESS IMAGE
 @app.route('/compress-image', methods=['POST'])
 @csrf.exempt
 def compress_image() -> FlaskResponse:
@@ -1161,129 +3314,57 @@ def compress_image() -> FlaskResponse:
     original_size = len(original_bytes)
     if original_size > MAX_FILE_SIZE:
         return jsonify({'error': f'File size exceeds {MAX_FILE_SIZE // (1024*1024)}MB'}), 403
+    if (ext := os.path.splitext(file.filename)[1].lower()) not in COMPRESSION_EXTENSIONS:
+        return jsonify({'error': 'Unsupported format. Use JPG or PNG.'}), 400
 
-    app.logger.info("--- Starting new image compression request ---")
-    app.logger.info(f"Original file: {file.filename}, Size: {original_size} bytes")
-
-    mozjpeg_path = "/usr/bin/mozjpeg" if os.path.exists("/usr/bin/mozjpeg") else None
-    pngquant_path = "/usr/bin/pngquant" if os.path.exists("/usr/bin/pngquant") else None
-    oxipng_path = "/usr/bin/oxipng" if os.path.exists("/usr/bin/oxipng") else None
-    
-    app.logger.info(f"Tool paths found: mozjpeg='{mozjpeg_path}', pngquant='{pngquant_path}', oxipng='{oxipng_path}'")
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            target_reduction = max(0, min(90, int(request.form.get('target_reduction', 50))))
-            target_size = original_size * (1 - (target_reduction / 100))
-            ext = os.path.splitext(file.filename)[1].lower()
-            
-            final_bytes, mimetype, ext_out, compression_method = None, '', '', "unknown"
-
-            if ext in ['.jpg', '.jpeg']:
-                mimetype, ext_out = 'image/jpeg', 'jpg'
-                if not mozjpeg_path:
-                    app.logger.warning("mozjpeg not found. Falling back to Pillow for JPG.")
-                    compression_method = "pillow_fallback"
-                    final_bytes = _compress_with_pillow(original_bytes, ext, target_size, original_size)
-                else:
-                    compression_method = "mozjpeg"
-                    input_path, output_path = os.path.join(temp_dir, f"original{ext}"), os.path.join(temp_dir, f"compressed{ext}")
-                    with open(input_path, 'wb') as f: f.write(original_bytes)
-                    quality = max(40, 90 - int(target_reduction * 0.5))
-                    cmd = [mozjpeg_path, "-quality", str(quality), "-outfile", output_path, input_path]
-                    app.logger.info(f"Running mozjpeg command: {' '.join(cmd)}")
-                    result = subprocess.run(cmd, check=True, capture_output=True)
-                    app.logger.info(f"mozjpeg stdout: {result.stdout.decode()}")
-                    app.logger.error(f"mozjpeg stderr: {result.stderr.decode()}")
-                    with open(output_path, 'rb') as f: final_bytes = f.read()
-
-            elif ext == '.png':
-                img = Image.open(io.BytesIO(original_bytes))
-                has_transparency = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
-                app.logger.info(f"PNG detected. Mode: {img.mode}, Has transparency: {has_transparency}")
-
-                if not has_transparency and mozjpeg_path:
-                    app.logger.info("Non-transparent PNG detected. Converting to high-quality JPG for maximum efficiency.")
-                    mimetype, ext_out, compression_method = 'image/jpeg', 'jpg', "png_to_jpg_conversion"
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    output_buffer = io.BytesIO()
-                    img.save(output_buffer, format='JPEG', quality=85, optimize=True)
-                    final_bytes = output_buffer.getvalue()
-                else:
-                    app.logger.info("Graphic or transparent PNG detected. Applying PNG optimization pipeline.")
-                    mimetype, ext_out = 'image/png', 'png'
-                    input_path = os.path.join(temp_dir, "original.png")
-                    with open(input_path, 'wb') as f: f.write(original_bytes)
-                    current_path, methods_used = input_path, []
-
-                    if pngquant_path:
-                        quant_path = os.path.join(temp_dir, "quantized.png")
-                        
-                        # --- START: NEW QUALITY-FOCUSED SETTINGS ---
-                        # Map the slider (0-90) to a safe quality range (e.g., 98 down to 65)
-                        # This prevents the tool from destroying the image quality.
-                        quality_min = max(65, 100 - target_reduction)
-                        quality_max = 98
-                        # --- END: NEW QUALITY-FOCUSED SETTINGS ---
-
-                        cmd = [pngquant_path, '--force', '--skip-if-larger', f'--quality={quality_min}-{quality_max}', '--speed', '1', '--strip', '--output', quant_path, current_path]
-                        app.logger.info(f"Running pngquant command: {' '.join(cmd)}")
-                        result = subprocess.run(cmd, capture_output=True)
-                        app.logger.info(f"pngquant stdout: {result.stdout.decode()}")
-                        app.logger.error(f"pngquant stderr: {result.stderr.decode()}")
-                        if result.returncode == 0 and os.path.exists(quant_path) and os.path.getsize(quant_path) < os.path.getsize(current_path):
-                            current_path = quant_path
-                            methods_used.append("pngquant")
-                            app.logger.info(f"pngquant successful. New size: {os.path.getsize(current_path)}")
-                        else:
-                            app.logger.warning("pngquant did not produce a smaller file or failed.")
-                    
-                    if oxipng_path:
-                        oxi_path = os.path.join(temp_dir, "optimized.png")
-                        cmd = [oxipng_path, "-o", "4", "-s", "--strip", "safe", "-a", "-Z", "--out", oxi_path, current_path]
-                        app.logger.info(f"Running oxipng command: {' '.join(cmd)}")
-                        result = subprocess.run(cmd, check=True, capture_output=True)
-                        app.logger.info(f"oxipng stdout: {result.stdout.decode()}")
-                        app.logger.error(f"oxipng stderr: {result.stderr.decode()}")
-                        current_path = oxi_path
-                        methods_used.append("oxipng")
-                        app.logger.info(f"oxipng successful. New size: {os.path.getsize(current_path)}")
-
-                    if not methods_used:
-                        app.logger.warning("No external PNG tools used. Falling back to Pillow.")
-                        final_bytes, compression_method = _compress_with_pillow(original_bytes, ext, target_size, original_size), "pillow_fallback"
-                    else:
-                        with open(current_path, 'rb') as f: final_bytes = f.read()
-                        compression_method = "+".join(methods_used)
-            else:
-                return jsonify({'error': 'Unsupported format. Use JPG or PNG.'}), 400
-
-            if final_bytes is None: raise RuntimeError("Compression failed and no fallback result was produced.")
-
-            final_size = len(final_bytes)
-            success = final_size <= target_size
-            reduction_percent = ((original_size - final_size) / original_size) * 100 if original_size > 0 else 0
-            app.logger.info(f"Final compression method: '{compression_method}'. Final size: {final_size} bytes. Reduction: {reduction_percent:.2f}%")
-            app.logger.info("--- Finished image compression request ---")
-
-            if final_size < original_size:
-                track_usage('compressor', metadata={'file_type': ext.replace('.', '').upper(), 'original_size': original_size, 'compressed_size': final_size, 'target_reduction': target_reduction, 'method': compression_method})
-
-            filename = f"compressed_{os.path.splitext(file.filename)[0]}.{ext_out}"
-            resp = send_file(io.BytesIO(final_bytes), mimetype=mimetype, as_attachment=True, download_name=filename)
-            resp.headers['X-Original-Size'], resp.headers['X-Compressed-Size'] = str(original_size), str(final_size)
-            resp.headers['X-Compression-Successful'], resp.headers['X-Compression-Method'] = str(success).lower(), compression_method
-            return resp
-
-        except subprocess.CalledProcessError as e:
-            app.logger.error(f"Compression tool failed! STDERR: {e.stderr.decode()}")
-            return jsonify({'error': 'The compression engine failed. The image may be corrupt or in an unsupported format.'}), 500
-        except Exception as e:
-            app.logger.error(f"An unexpected server error occurred during compression: {e}")
-            traceback.print_exc()
-            return jsonify({'error': 'An unexpected server error occurred during compression.'}), 500
-# END: DEBUGLOGGING FOR COMPRESS IMAGE
+    app.logger.info(f"Compressing {file.filename}, Size: {original_size} bytes")
+    try:
+        target_reduction = max(0, min(90, int(request.form.get('target_reduction', 50))))
+        target_size = original_size * (1 - (target_reduction / 100))
+        future = COMPRESSION_POOL.submit(run_compression_job, original_bytes, ext, target_reduction)
+        if future is None or not COMPRESSION_POOL.wait_until_started(future, COMPRESSION_QUEUE_TIMEOUT):
+            resp = jsonify({'error': 'The compressor is busy right now. Please try again in a moment.'})
+            resp.headers['Retry-After'] = '5'
+            return resp, 503
+        # The clock starts once the job is running; the CPU and memory caps are enforced inside the worker.
+        job = future.result(timeout=COMPRESSION_JOB_TIMEOUT)
+        final_bytes, mimetype, ext_out, compression_method = job['bytes'], job['mimetype'], job['ext'], job['method']
+        if final_bytes is None: raise RuntimeError("Compression failed and no fallback result was produced.")
+
+        final_size = len(final_bytes)
+        success = final_size <= target_size
+        reduction_percent = ((original_size - final_size) / original_size) * 100 if original_size > 0 else 0
+        app.logger.info(f"Final compression method: '{compression_method}'. Final size: {final_size} bytes. Reduction: {reduction_percent:.2f}%")
+
+        if final_size < original_size:
+            track_usage('compressor', metadata={'file_type': ext.replace('.', '').upper(), 'original_size': original_size, 'compressed_size': final_size, 'target_reduction': target_reduction, 'method': compression_method})
+
+        filename = f"compressed_{os.path.splitext(file.filename)[0]}.{ext_out}"
+        resp = send_file(io.BytesIO(final_bytes), mimetype=mimetype, as_attachment=True, download_name=filename)
+        resp.headers['X-Original-Size'], resp.headers['X-Compressed-Size'] = str(original_size), str(final_size)
+        resp.headers['X-Compression-Successful'], resp.headers['X-Compression-Method'] = str(success).lower(), compression_method
+        resp.headers['X-Compression-Encodes'] = str(job['encodes'])
+        return resp
+
+    except (CompressionLimitExceeded, MemoryError) as e:
+        app.logger.error(f"Compression job exceeded its limits: {e}")
+        return jsonify({'error': 'This image is too expensive to compress within the server limits.'}), 413
+    except FutureTimeoutError:
+        app.logger.error(f"Compression job still running after {COMPRESSION_JOB_TIMEOUT}s.")
+        resp = jsonify({'error': 'The compressor is overloaded right now. Please try again in a moment.'})
+        resp.headers['Retry-After'] = '5'
+        return resp, 503
+    except BrokenProcessPool:
+        COMPRESSION_POOL.reset()
+        app.logger.error("A compression worker died; the pool will be restarted.")
+        return jsonify({'error': 'The compression engine failed. Please try again.'}), 500
+    except (CompressionToolError, UnidentifiedImageError) as e:
+        app.logger.error(f"Compression tool failed! {e}")
+        return jsonify({'error': 'The compression engine failed. The image may be corrupt or in an unsupported format.'}), 500
+    except Exception as e:
+        app.logger.error(f"An unexpected server error occurred during compression: {e}")
+        traceback.print_exc()
+        return jsonify({'error': 'An unexpected server error occurred during compression.'}), 500
 
 
 @app.route('/download-image')
@@ -1291,25 +3372,345 @@ def compress_image() -> FlaskResponse:
 def download_image() -> FlaskResponse:
     if not (image_url := request.args.get('url')) or not (page_url := request.args.get('page_url')):
         return "Missing URL parameters", 400
+    target_format = request.args.get('format', 'original').lower()
+    if target_format != 'original' and target_format not in DOWNLOAD_FORMATS:
+        return f"format must be 'original' or one of {', '.join(DOWNLOAD_FORMATS)}", 400
+    image_url = unquote(image_url)
+    headers = {'User-Agent': 'Mozilla/5.0', 'Referer': unquote(page_url)}
+    name = download_file_stem(image_url)
     try:
-        headers = {'User-Agent': 'Mozilla/5.0', 'Referer': unquote(page_url)}
-        resp = requests.get(unquote(image_url), headers=headers, stream=True, timeout=10)
-        resp.raise_for_status()
-        mimetype = resp.headers.get('Content-Type', 'application/octet-stream')
-        name = re.sub(r'[^a-zA-Z0-9_-]', '', os.path.splitext(unquote(image_url).split('/')[-1].split('?')[0])[0] or 'image')
-        if 'svg' in mimetype: ext = 'svg'
-        elif 'gif' in mimetype: ext = 'gif'
-        else: ext = 'png'
-        final_bytes = resp.content
-        if ext == 'png' and 'svg' not in mimetype and 'gif' not in mimetype:
-            final_bytes_io = io.BytesIO()
-            Image.open(io.BytesIO(resp.content)).convert("RGBA").save(final_bytes_io, format='PNG')
-            final_bytes = final_bytes_io.getvalue()
-        return Response(final_bytes, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename=\"{name[:100]}.{ext}\""})
+        if target_format == 'original':
+            # Pass the body through in chunks; the byte cap is enforced as it streams.
+            stack = ExitStack()
+            try:
+                resp = stack.enter_context(OUTBOUND_HTTP.stream_public('GET', image_url, headers=headers, timeout=10))
+                resp.raise_for_status()
+                ensure_image_response(resp)
+            except Exception:
+                stack.close()
+                raise
+            mimetype = resp.headers.get('Content-Type', 'application/octet-stream')
+            response_headers = {"Content-Disposition": f"attachment; filename=\"{name}.{download_extension(mimetype, image_url)}\""}
+            # iter_content undoes Content-Encoding, so the upstream length only holds for unencoded bodies.
+            if not resp.headers.get('Content-Encoding') and (length := resp.headers.get('Content-Length', '')).isdigit():
+                response_headers['Content-Length'] = length
+            response = Response(OUTBOUND_HTTP.iter_capped(resp), mimetype=mimetype, headers=response_headers)
+            response.call_on_close(stack.close)
+            return response
+
+        spool, content_type = fetch_image_to_spool(image_url, headers, OUTBOUND_MAX_RESPONSE_BYTES)
+        if download_extension(content_type, image_url) == 'svg':
+            spool.close()
+            return "SVG images can only be downloaded in their original format", 415
+        try:
+            converted = convert_image_file(spool, target_format)
+        finally:
+            spool.close()
+        _, ext, mimetype = DOWNLOAD_FORMATS[target_format]
+        return send_file(converted, mimetype=mimetype, as_attachment=True, download_name=f"{name}.{ext}")
+    except BlockedDestination:
+        return "Image URL is not allowed", 403
+    except NotAnImage as e:
+        return f"The URL did not return an image: {e}", 415
+    except ResponseTooLarge as e:
+        return f"Image is too large: {e}", 413
+    except requests.RequestException as e:
+        return f"Failed to fetch image: {e}", 502
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+        return f"Could not convert image to {target_format}: {e}", 415
     except Exception as e:
         traceback.print_exc()
         return f"Failed to process image: {e}", 500
 
+# --- START: IMAGE THUMBNAILS ---
+THUMB_CACHE_DIR = os.path.join(app.instance_path, 'thumbs')
+THUMB_CACHE_MAX_BYTES: int = int(os.environ.get('THUMB_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+THUMB_SIZES: Tuple[int, ...] = (160, 320, 640)
+THUMB_MAX_SOURCE_BYTES: int = 20 * 1024 * 1024
+THUMB_WEBP_QUALITY: int = 70
+THUMB_MAX_AGE: int = 30 * 24 * 3600
+THUMB_EVICT_EVERY: int = 50
+# Uncached thumbnails each cost an outbound fetch, so each client gets this many per minute (per web worker).
+# Comfortably above one results page, which can show a few hundred images.
+THUMB_FETCHES_PER_MINUTE: int = int(os.environ.get('THUMB_FETCHES_PER_MINUTE', 600))
+THUMB_FETCH_COUNTS: TTLCache = TTLCache(maxsize=10000, ttl=60)
+THUMB_FETCH_COUNTS_LOCK = threading.Lock()
+
+def thumbnail_client_key() -> str:
+    """Signed-in users are limited per account, everyone else per client address."""
+    return f"user:{current_user.id}" if current_user.is_authenticated else f"addr:{request.remote_addr or ''}"
+
+def allow_thumbnail_fetch(client: str) -> bool:
+    with THUMB_FETCH_COUNTS_LOCK:
+        window = (client, int(time.time() // 60))
+        THUMB_FETCH_COUNTS[window] = count = THUMB_FETCH_COUNTS.get(window, 0) + 1
+    return count <= THUMB_FETCHES_PER_MINUTE
+
+class ThumbnailCache:
+    """WebP thumbnails on disk, named by a hash of (image URL, size).
+
+    A hit touches the file's mtime, so trimming the oldest mtimes first evicts the least recently
+    used thumbnails. The directory is only rescanned every THUMB_EVICT_EVERY writes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_url: str, size: int) -> str:
+        return hashlib.sha256(f"{image_url}|{size}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.webp")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            os.utime(path := self._path(key))
+            return path
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f: f.write(data)
+        os.replace(tmp_path, path := self._path(key))
+        with self._lock:
+            self._writes += 1
+            due = self._writes % THUMB_EVICT_EVERY == 1
+        if due: self.evict()
+        return path
+
+    def evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith('.webp'): entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+            except OSError:
+                continue
+        if (total := sum(size for _, size, _ in entries)) <= self.max_bytes: return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            if total <= self.max_bytes * 0.9: break
+
+def make_thumbnail(data: bytes, size: int) -> bytes:
+    """Downscales an image to fit in size x size and encodes it as WebP."""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.width > MAX_IMAGE_DIMENSIONS[0] or img.height > MAX_IMAGE_DIMENSIONS[1]:
+            raise ValueError(f"Image is {img.width}x{img.height}, over the {MAX_IMAGE_DIMENSIONS} limit")
+        # JPEGs decode straight at 1/2..1/8 scale; thumbnail() then reduce()s by whole factors before resampling.
+        img.draft('RGB', (size, size))
+        img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+        out = io.BytesIO()
+        img.convert('RGBA' if has_alpha else 'RGB').save(out, format='WEBP', quality=THUMB_WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+THUMB_CACHE = ThumbnailCache(THUMB_CACHE_DIR, THUMB_CACHE_MAX_BYTES)
+# --- END: IMAGE THUMBNAILS ---
+
+@app.route('/thumb')
+def image_thumbnail() -> FlaskResponse:
+    image_url = request.args.get('url', '')
+    if not image_url.startswith(('http://', 'https://')):
+        return "Missing or invalid image URL", 400
+    requested = request.args.get('size', 320, type=int) or 320
+    size = min(THUMB_SIZES, key=lambda s: abs(s - requested))
+    key = THUMB_CACHE.make_key(image_url, size)
+
+    if (path := THUMB_CACHE.get(key)) is None:
+        if not allow_thumbnail_fetch(thumbnail_client_key()):
+            return "Too many previews requested, slow down", 429, {'Retry-After': '60'}
+        headers = {'User-Agent': STATIC_USER_AGENT}
+        if page_url := request.args.get('page_url'): headers['Referer'] = page_url
+        try:
+            resp = OUTBOUND_HTTP.get_public(image_url, headers=headers, timeout=10, max_bytes=THUMB_MAX_SOURCE_BYTES)
+            resp.raise_for_status()
+            path = THUMB_CACHE.put(key, make_thumbnail(resp.content, size))
+        except BlockedDestination:
+            return "Image URL is not allowed", 403
+        except ResponseTooLarge:
+            return "Image is too large to preview", 413
+        except requests.RequestException as e:
+            return f"Failed to fetch image: {e}", 502
+        except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+            return "Image cannot be previewed", 415
+
+    response = send_file(path, mimetype='image/webp', max_age=THUMB_MAX_AGE, etag=key, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# --- START: BULK IMAGE DOWNLOADS ---
+DOWNLOAD_ZIP_MAX_FILES: int = int(os.environ.get('DOWNLOAD_ZIP_MAX_FILES', 100))
+DOWNLOAD_ZIP_MAX_BYTES: int = int(os.environ.get('DOWNLOAD_ZIP_MAX_BYTES', 200 * 1024 * 1024))
+DOWNLOAD_ZIP_WORKERS: int = int(os.environ.get('DOWNLOAD_ZIP_WORKERS', 6))
+DOWNLOAD_SPOOL_BYTES: int = 1024 * 1024
+DOWNLOAD_CHUNK_BYTES: int = 64 * 1024
+# format option -> (Pillow format, file extension, MIME type)
+DOWNLOAD_FORMATS: Dict[str, Tuple[str, str, str]] = {'png': ('PNG', 'png', 'image/png'), 'webp': ('WEBP', 'webp', 'image/webp'), 'jpeg': ('JPEG', 'jpg', 'image/jpeg')}
+DOWNLOAD_EXTENSIONS: Dict[str, str] = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp', 'image/avif': 'avif',
+                                       'image/svg+xml': 'svg', 'image/bmp': 'bmp', 'image/x-icon': 'ico', 'image/vnd.microsoft.icon': 'ico'}
+
+def download_file_stem(image_url: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_-]', '', os.path.splitext(unquote(image_url).split('/')[-1].split('?')[0])[0] or 'image')[:100] or 'image'
+
+class NotAnImage(requests.RequestException):
+    """The server answered with something other than an image/* body."""
+
+def ensure_image_response(resp: requests.Response) -> None:
+    if not (content_type := resp.headers.get('Content-Type', '')).split(';')[0].strip().lower().startswith('image/'):
+        raise NotAnImage(f"not an image ({content_type or 'no Content-Type'})")
+
+def download_extension(content_type: str, image_url: str) -> str:
+    if ext := DOWNLOAD_EXTENSIONS.get(content_type.split(';')[0].strip().lower()): return ext
+    url_ext = os.path.splitext(urlparse(image_url).path)[1].lstrip('.').lower()
+    return url_ext if url_ext in DOWNLOAD_EXTENSIONS.values() or url_ext == 'jpeg' else 'bin'
+
+def fetch_image_to_spool(image_url: str, headers: Dict[str, str], max_bytes: int) -> Tuple[Any, str]:
+    """Streams an image into a temp file that stays in memory only while small. Returns (file, content_type).
+
+    Only public addresses are fetched, and anything not served as image/* raises NotAnImage.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+    try:
+        with OUTBOUND_HTTP.stream_public('GET', image_url, headers=headers, timeout=10, max_bytes=max_bytes) as resp:
+            resp.raise_for_status()
+            ensure_image_response(resp)
+            for chunk in OUTBOUND_HTTP.iter_capped(resp, DOWNLOAD_CHUNK_BYTES): spool.write(chunk)
+            content_type = resp.headers.get('Content-Type', 'application/octet-stream')
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, content_type
+
+def convert_image_file(source: Any, target_format: str) -> Any:
+    """Decodes an image, refusing anything over MAX_IMAGE_DIMENSIONS, and re-encodes it into a new temp file."""
+    pil_format = DOWNLOAD_FORMATS[target_format][0]
+    with Image.open(source) as img:
+        if img.width > MAX_IMAGE_DIMENSIONS[0] or img.height > MAX_IMAGE_DIMENSIONS[1]:
+            raise ValueError(f"Image is {img.width}x{img.height}, over the {MAX_IMAGE_DIMENSIONS} limit")
+        has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+        out = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+        img.convert('RGBA' if has_alpha and pil_format != 'JPEG' else 'RGB').save(out, format=pil_format)
+    out.seek(0)
+    return out
+
+class _ZipStreamSink:
+    """Write-only, unseekable target for zipfile; the response drains what was written between entries."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_image_zip(image_urls: List[str], headers: Dict[str, str], target_format: str = 'original'):
+    """Yields a ZIP archive of the images as it is built.
+
+    Images are fetched a few at a time ahead of the writer into spooled temp files, and each one is
+    copied into the archive in chunks, so neither a whole image nor the whole archive sits in memory.
+    Failed, unconvertible or over-budget images are listed in SKIPPED.txt.
+    """
+    sink = _ZipStreamSink()
+    executor = ThreadPoolExecutor(max_workers=DOWNLOAD_ZIP_WORKERS, thread_name_prefix='zip-download')
+    queued = iter(image_urls)
+    pending: Dict[Future, str] = {}
+    used_names: Set[str] = set()
+    skipped: List[str] = []
+    total_bytes = 0
+
+    def submit_next() -> None:
+        if (image_url := next(queued, None)) is not None:
+            pending[executor.submit(fetch_image_to_spool, image_url, headers, min(OUTBOUND_MAX_RESPONSE_BYTES, DOWNLOAD_ZIP_MAX_BYTES))] = image_url
+
+    try:
+        for _ in range(DOWNLOAD_ZIP_WORKERS * 2): submit_next()
+        # ZIP_STORED: images are already compressed, and deflating them again only burns CPU.
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    image_url = pending.pop(future)
+                    submit_next()
+                    try:
+                        spool, content_type = future.result()
+                    except Exception as e:
+                        skipped.append(f"{image_url}: {e}")
+                        continue
+                    source, ext = spool, download_extension(content_type, image_url)
+                    try:
+                        if target_format != 'original' and ext != 'svg':
+                            source, ext = convert_image_file(spool, target_format), DOWNLOAD_FORMATS[target_format][1]
+                        size = source.seek(0, io.SEEK_END)
+                        source.seek(0)
+                        if total_bytes + size > DOWNLOAD_ZIP_MAX_BYTES:
+                            skipped.append(f"{image_url}: archive size limit reached")
+                            continue
+                        total_bytes += size
+                        name, counter = f"{download_file_stem(image_url)}.{ext}", 1
+                        while name in used_names:
+                            counter += 1
+                            name = f"{download_file_stem(image_url)}-{counter}.{ext}"
+                        used_names.add(name)
+                        with archive.open(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), 'w') as entry:
+                            while chunk := source.read(DOWNLOAD_CHUNK_BYTES):
+                                entry.write(chunk)
+                                if data := sink.drain(): yield data
+                    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+                        skipped.append(f"{image_url}: could not convert to {target_format} ({e})")
+                    finally:
+                        if source is not spool: source.close()
+                        spool.close()
+                    if data := sink.drain(): yield data
+            if skipped: archive.writestr('SKIPPED.txt', '\n'.join(skipped) + '\n')
+        if data := sink.drain(): yield data
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None: future.result()[0].close()
+# --- END: BULK IMAGE DOWNLOADS ---
+
+@app.route('/download-images', methods=['POST'])
+@login_required
+def download_images_zip() -> FlaskResponse:
+    # Accepts JSON or a plain form post, so the browser can stream the archive straight to disk.
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        image_urls, page_url, target_format = payload.get('urls'), payload.get('page_url'), payload.get('format') or 'original'
+    else:
+        image_urls, page_url, target_format = request.form.getlist('urls'), request.form.get('page_url'), request.form.get('format') or 'original'
+    if not isinstance(image_urls, list) or not image_urls:
+        return jsonify({'error': 'A list of image urls is required'}), 400
+    image_urls = list(dict.fromkeys(u for u in image_urls if isinstance(u, str) and u.startswith(('http://', 'https://'))))
+    if len(image_urls) > DOWNLOAD_ZIP_MAX_FILES:
+        return jsonify({'error': f'At most {DOWNLOAD_ZIP_MAX_FILES} images can be downloaded at once'}), 400
+    if target_format != 'original' and target_format not in DOWNLOAD_FORMATS:
+        return jsonify({'error': f"format must be 'original' or one of {', '.join(DOWNLOAD_FORMATS)}"}), 400
+
+    headers = {'User-Agent': STATIC_USER_AGENT}
+    if page_url: headers['Referer'] = page_url
+    track_usage('image_zip_download', metadata={'count': len(image_urls), 'format': target_format})
+    return Response(stream_image_zip(image_urls, headers, target_format), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename="images.zip"', 'X-Accel-Buffering': 'no'})
+
 @app.route('/admin')
 @app.route('/admin/dashboard')
 @login_required
@@ -1341,6 +3742,12 @@ def admin_dashboard():
         tool_usage_counts=dict(tool_usage_counts), recent_users=recent_users, ga_data=ga_data, active_v_inactive=active_v_inactive
     )
 
+@app.route('/admin/outbound-metrics')
+@login_required
+@admin_required
+def outbound_metrics():
+    return jsonify(OUTBOUND_HTTP.metrics_snapshot())
+
 @app.route('/admin/analytics/acquisition')
 @login_required
 @admin_required
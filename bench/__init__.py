@@ -0,0 +1 @@
+"""Benchmarks for the extraction hot paths. Run with `python -m bench --help` from the repo root."""
@@ -0,0 +1,120 @@
+"""Command-line entry point: `python -m bench <command>`. Importing app needs the same environment as the web app."""
+import os
+import time
+from typing import Any, Dict, List
+
+import click
+import numpy as np
+from bs4 import BeautifulSoup
+
+import app
+from bench.legacy_html import (detect_adobe_fonts_usage, extract_all_images_from_html,
+                               extract_css_background_images, extract_fonts_from_google_links,
+                               get_stylesheet_urls)
+
+FONT_BENCH_STACKS: List[str] = [
+    '"Inter var", -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif, "Apple Color Emoji"',
+    'Roboto Flex Variable, system-ui, sans-serif', '"Open Sans", "Helvetica Neue", Arial, sans-serif',
+    'Lato-Bold, LatoWeb, sans-serif', '"Playfair Display", Georgia, serif', '"Montserrat SemiBold", sans-serif',
+    'CircularStd-Book, "Circular Std", Helvetica, sans-serif', '"Font Awesome 6 Free"', 'eicons', '"GT Walsheim Pro Medium", sans-serif',
+    'wf_5d1c6b8e2a, sans-serif', 'orig_futura-pt, "Futura PT", sans-serif', '"Source Sans Pro", "Segoe UI Emoji", sans-serif',
+    '"Noto Sans JP", "Noto Color Emoji", sans-serif', 'Gilroy-ExtraBold, Gilroy, sans-serif', '"DM Sans", "Times New Roman", serif',
+    'Merriweather, Georgia, "Segoe UI Symbol", serif', '"Fira Code", ui-monospace, monospace', 'proxima-nova, sans-serif', 'Interstate, Verdana, sans-serif',
+]
+
+
+@click.group()
+def cli():
+    """Benchmarks for the asset extraction hot paths."""
+
+
+@cli.command("html-scanner")
+@click.argument("html_files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--base-url", default="https://example.com/", help="URL the saved pages are resolved against.")
+@click.option("--rounds", default=20, help="Timed repetitions per file.")
+def bench_html_scanner(html_files, base_url, rounds):
+    """Compares scan_html_assets with the BeautifulSoup helpers over saved HTML fixtures."""
+    def soup_helpers(html: str) -> Dict[str, Any]:
+        soup = BeautifulSoup(html, 'html.parser')
+        return {
+            'images': extract_all_images_from_html(soup, base_url),
+            'inline_backgrounds': extract_css_background_images(soup, base_url, stylesheets=[]),
+            'stylesheets': get_stylesheet_urls(soup, base_url),
+            'google_fonts': sorted(extract_fonts_from_google_links(soup)),
+            'has_typekit': detect_adobe_fonts_usage(soup),
+        }
+    for path in html_files:
+        with open(path, encoding='utf-8', errors='replace') as f: html = f.read()
+        expected, scanned = soup_helpers(html), app.scan_html_assets(html, base_url)
+        mismatches = [key for key in expected if expected[key] != scanned[key]]
+        timings = {}
+        for name, fn in (('beautifulsoup', soup_helpers), ('lxml scanner', lambda h: app.scan_html_assets(h, base_url))):
+            started = time.perf_counter()
+            for _ in range(rounds): fn(html)
+            timings[name] = (time.perf_counter() - started) / rounds * 1000
+        print(f"{os.path.basename(path)}: {len(html) // 1024} KB, soup {timings['beautifulsoup']:.1f} ms, "
+              f"scanner {timings['lxml scanner']:.1f} ms, speedup {timings['beautifulsoup'] / timings['lxml scanner']:.1f}x"
+              + (f", MISMATCH in {', '.join(mismatches)}" if mismatches else ''))
+
+
+@cli.command("font-classifier")
+@click.option("--corpus", type=click.File(), help="File of computed font-family stacks, one per line (defaults to a built-in sample).")
+@click.option("--rounds", default=200, help="Times the corpus is classified.")
+def bench_font_classifier(corpus, rounds):
+    """Times process_fonts over a corpus of font stacks, cold (memos cleared every round) and warm."""
+    stacks = [line.strip() for line in corpus if line.strip()] if corpus else FONT_BENCH_STACKS
+    app.get_font_classifier()
+    for label, clear in (('cold', True), ('warm', False)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            if clear:
+                for memo in (app.split_font_stack, app.font_name_key, app.font_search_name): memo.cache_clear()
+            results = app.process_fonts(stacks, [], False)
+        elapsed = time.perf_counter() - started
+        print(f"{label}: {rounds * len(stacks) / elapsed:,.0f} stacks/s ({elapsed / rounds * 1000:.2f} ms per {len(stacks)}-stack page)")
+    for result in results: print(f"  {result['displayName']!r:32} -> {result['type']}{' (' + result['urlName'] + ')' if 'urlName' in result else ''}")
+
+
+@cli.command("color-palette")
+@click.option("--sizes", default="1000,10000,50000", help="Comma-separated numbers of distinct input colours.")
+@click.option("--rounds", default=5, help="Timed repetitions per size.")
+def bench_color_palette(sizes, rounds):
+    """Times get_clustered_color_palette on synthetic computed-style colour maps."""
+    rng = np.random.default_rng(0)
+    for size in (int(n) for n in sizes.split(',')):
+        rgb = rng.integers(0, 256, size=(size, 3))
+        areas = rng.pareto(1.5, size=size) * 1000
+        color_data = {f"rgb({r}, {g}, {b})": float(a) for (r, g, b), a in zip(rgb, areas)}
+        started = time.perf_counter()
+        for _ in range(rounds): palette = app.get_clustered_color_palette(color_data)
+        elapsed = (time.perf_counter() - started) / rounds * 1000
+        print(f"{len(color_data)} colours: {elapsed:.1f} ms per palette, primary {palette.get('Primary Palette', [])[:4]}")
+
+
+@cli.command("style-scan")
+@click.argument("urls", nargs=-1, required=True)
+@click.option("--rounds", default=3, help="Timed repetitions per URL and mode.")
+def bench_style_scan(urls, rounds):
+    """Renders each URL once and times the fast and full computed-style scans against it."""
+    async def bench(url: str) -> None:
+        async with app.BROWSER_POOL.page() as page:
+            await page.goto(url, {'waitUntil': 'networkidle2', 'timeout': 30000})
+            results = {}
+            for mode in ('full', 'fast'):
+                timings = []
+                for _ in range(rounds):
+                    results[mode] = await app.scan_computed_styles(page, mode)
+                    timings.append(results[mode]['stats']['elapsed_ms'])
+                results[mode]['ms'] = sorted(timings)[len(timings) // 2]
+            palettes = {mode: app.get_clustered_color_palette(r['colors']).get('Primary Palette', []) for mode, r in results.items()}
+            stats = results['fast']['stats']
+            print(f"{url}: {stats['nodes_total']} nodes, full {results['full']['ms']} ms, fast {results['fast']['ms']} ms "
+                  f"({stats['nodes_scanned']} scanned, {stats['signatures']} signatures, {stats['sampled_signatures']} sampled); "
+                  f"fonts equal: {set(results['full']['fonts']) == set(results['fast']['fonts'])}, "
+                  f"top palette overlap: {len(set(palettes['full'][:5]) & set(palettes['fast'][:5]))}/5")
+    for url in urls:
+        app.BROWSER_POOL.run(bench(url))
+
+
+if __name__ == '__main__':
+    cli()
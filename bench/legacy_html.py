@@ -0,0 +1,57 @@
+"""The BeautifulSoup asset helpers that scan_html_assets replaced, kept as the reference the HTML benchmark checks against."""
+from typing import List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag as SoupTag
+
+from app import (CSS_URL_PATTERN, STYLESHEET_PHASE_BUDGET, extract_stylesheet_image_urls,
+                 fetch_stylesheets, get_largest_from_srcset)
+
+
+def extract_all_images_from_html(soup: BeautifulSoup, base_url: str) -> Set[str]:
+    image_urls: Set[str] = set()
+    for img in soup.find_all('img'):
+        src_to_use: Optional[str] = None
+        if isinstance(parent := img.find_parent('picture'), SoupTag):
+            for source in parent.find_all('source'):
+                if isinstance(source, SoupTag) and (srcset_attr := source.get('srcset')) and isinstance(srcset_attr, str):
+                    if src_to_use := get_largest_from_srcset(srcset_attr): break
+        if not src_to_use:
+            srcset_val = img.get('data-srcset') or img.get('srcset')
+            src_val = img.get('data-src') or img.get('src')
+            src_to_use = get_largest_from_srcset(srcset_val) if isinstance(srcset_val, str) else src_val
+        if isinstance(src_to_use, str) and not src_to_use.startswith(('data:image', 'about:blank')):
+            if len(full_url := urljoin(base_url, src_to_use)) < 2048: image_urls.add(full_url)
+    return image_urls
+
+def get_stylesheet_urls(soup: BeautifulSoup, base_url: str) -> List[str]:
+    return [urljoin(base_url, href) for link in soup.find_all('link', rel='stylesheet', href=True) if isinstance(href := link.get('href'), str)]
+
+def extract_css_background_images(soup: BeautifulSoup, base_url: str, time_budget: float = STYLESHEET_PHASE_BUDGET, stylesheets: Optional[List[Tuple[str, str]]] = None) -> Set[str]:
+    image_urls: Set[str] = set()
+    for element in soup.select('[style*="background-image"]'):
+        if isinstance(style := element.get('style'), str) and (match := CSS_URL_PATTERN.search(style)):
+            if (url := match.group(1).strip("'\"")) and not url.startswith('data:image'):
+                if len(full_url := urljoin(base_url, url)) < 2048:
+                    image_urls.add(full_url)
+    if stylesheets is None:
+        stylesheets = fetch_stylesheets(get_stylesheet_urls(soup, base_url), time_budget)
+    return image_urls | extract_stylesheet_image_urls(stylesheets)
+
+def extract_fonts_from_google_links(soup: BeautifulSoup) -> List[str]:
+    found_fonts: Set[str] = set()
+    for link in soup.find_all('link', href=True):
+        if isinstance(link, SoupTag) and isinstance(href := link.get('href'), str) and 'fonts.googleapis.com/css' in href:
+            if 'family' in (query_params := parse_qs(urlparse(href).query)):
+                for family_str in query_params['family']:
+                    for font_name in family_str.split('|'):
+                        found_fonts.add(font_name.split(':')[0].replace('+', ' ').strip())
+    return list(found_fonts)
+
+def detect_adobe_fonts_usage(soup: BeautifulSoup) -> bool:
+    for el_type in ['link', 'script']:
+        for el in soup.find_all(el_type, href=True):
+            if isinstance(href := el.get('href'), str) and 'use.typekit.net' in href:
+                return True
+    return False
@@ -201,28 +201,34 @@ function initExtractorTool() {
     const imageModal = document.getElementById('image-modal');
     const modalImage = document.getElementById('modal-image');
     const modalCloseBtn = document.getElementById('modal-close-btn');
+    const downloadAllBtn = document.getElementById('download-all-btn');
 
     // --- Result Display Functions ---
 
-    function displayImages(images, pageUrl) {
-        imagesGrid.innerHTML = '';
+    function displayImages(images, pageUrl, append = false) {
+        if (!append) imagesGrid.innerHTML = '';
         if (!images || images.length === 0) {
-            imagesSection.classList.add('hidden');
+            if (!append) imagesSection.classList.add('hidden');
             return;
         }
         imagesSection.classList.remove('hidden');
-        images.forEach(imageUrl => {
+        images.forEach(image => {
+            // Entries are bare URLs, or objects with probed size and dimensions when the scan asked for them.
+            const imageUrl = typeof image === 'string' ? image : image.url;
             const item = document.createElement('div');
             item.className = 'image-item';
+            item.dataset.url = imageUrl;
             const img = document.createElement('img');
-            img.src = imageUrl;
+            // Previews come from the server-side thumbnail cache; fall back to the original if it cannot make one.
+            img.src = `/thumb?size=320&url=${encodeURIComponent(imageUrl)}&page_url=${encodeURIComponent(pageUrl)}`;
+            img.onerror = () => { img.onerror = null; img.src = imageUrl; };
             img.alt = 'Extracted Image';
             img.loading = 'lazy';
 
             const overlay = document.createElement('div');
             overlay.className = 'image-item-overlay';
             
-            const downloadUrl = `/download-image?url=${encodeURIComponent(imageUrl)}&page_url=${encodeURIComponent(pageUrl)}`;
+            const downloadUrl = `/download-image?url=${encodeURIComponent(imageUrl)}&page_url=${encodeURIComponent(pageUrl)}&format=original`;
             
             overlay.innerHTML = `
                 <div class="action-buttons">
@@ -238,6 +244,7 @@ function initExtractorTool() {
             
             item.appendChild(img);
             item.appendChild(overlay);
+            if (typeof image !== 'string') showImageInfo(item, image);
             imagesGrid.appendChild(item);
 
             item.querySelector('.view-btn').addEventListener('click', (e) => {
@@ -248,6 +255,21 @@ function initExtractorTool() {
         });
     }
 
+    function showImageInfo(item, info) {
+        const parts = [];
+        if (info.width && info.height) parts.push(`${info.width}×${info.height}`);
+        if (info.format) parts.push(info.format);
+        if (info.bytes) parts.push(formatBytes(info.bytes, 1));
+        if (parts.length === 0) return;
+        let badge = item.querySelector('.image-item-info');
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'image-item-info';
+            item.appendChild(badge);
+        }
+        badge.textContent = parts.join(' · ');
+    }
+
     function displayColors(colorGroups) {
         colorsContainer.innerHTML = '';
         if (!colorGroups || Object.keys(colorGroups).length === 0) {
@@ -367,6 +389,44 @@ function initExtractorTool() {
             'extract_images': extractImagesCheck.checked,
             'extract_colors': extractColorsCheck.checked,
             'extract_fonts': extractFontsCheck.checked,
+            'stream': true,
+            'probe': true,
+        };
+
+        // Each NDJSON line is one finished section; render it straight away instead of waiting for the whole scan.
+        const renderRecord = (record) => {
+            switch (record.type) {
+                case 'images':
+                    displayImages(record.images, url, true);
+                    break;
+                case 'image_info':
+                    record.images.forEach(info => {
+                        const item = Array.from(imagesGrid.children).find(el => el.dataset.url === info.url);
+                        if (item) showImageInfo(item, info);
+                    });
+                    return;
+                case 'fonts':
+                    loadGoogleFonts(record.fonts);
+                    displayFonts(record.fonts);
+                    break;
+                case 'colors':
+                    displayColors(record.colors);
+                    break;
+                case 'error':
+                    throw new Error(record.error);
+                case 'summary':
+                    if (record.partial) {
+                        errorMessage.textContent = 'The site was slow to respond, so these results may be incomplete.';
+                        errorMessage.classList.remove('hidden');
+                    }
+                    return;
+                default:
+                    return;
+            }
+            if (resultsContainer.classList.contains('hidden')) {
+                resultsContainer.classList.remove('hidden');
+                resultsContainer.scrollIntoView({ behavior: 'smooth', block: 'start' });
+            }
         };
 
         try {
@@ -376,21 +436,26 @@ function initExtractorTool() {
                 body: JSON.stringify(payload)
             });
 
-            const data = await response.json();
-
             if (!response.ok) {
+                const data = await response.json().catch(() => ({}));
                 if(response.status === 403) showUsageLimitModal();
                 throw new Error(data.error || `Server responded with status ${response.status}`);
             }
-            
-            if(data.fonts) loadGoogleFonts(data.fonts);
-            
-            displayImages(data.images, url);
-            displayColors(data.colors);
-            displayFonts(data.fonts);
-            
-            resultsContainer.classList.remove('hidden');
-            resultsContainer.scrollIntoView({ behavior: 'smooth', block: 'start' });
+
+            imagesGrid.innerHTML = '';
+            [imagesSection, colorsSection, fontsSection].forEach(section => section.classList.add('hidden'));
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffered.split('\n');
+                buffered = done ? '' : lines.pop();
+                lines.filter(line => line.trim()).forEach(line => renderRecord(JSON.parse(line)));
+                if (done) break;
+            }
 
         } catch (error) {
             errorMessage.textContent = `Error: ${error.message}`;
@@ -400,6 +465,31 @@ function initExtractorTool() {
         }
     });
     
+    // --- Bulk Download Logic ---
+    // A real form post lets the browser stream the ZIP straight to disk instead of buffering it as a blob.
+    if (downloadAllBtn) {
+        downloadAllBtn.addEventListener('click', () => {
+            const imageUrls = Array.from(imagesGrid.children).map(item => item.dataset.url).filter(Boolean);
+            if (imageUrls.length === 0) return;
+            const form = document.createElement('form');
+            form.method = 'POST';
+            form.action = '/download-images';
+            const addField = (name, value) => {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = name;
+                input.value = value;
+                form.appendChild(input);
+            };
+            imageUrls.slice(0, 100).forEach(imageUrl => addField('urls', imageUrl));
+            addField('page_url', urlInput.value.trim());
+            addField('csrf_token', downloadAllBtn.dataset.csrfToken);
+            document.body.appendChild(form);
+            form.submit();
+            form.remove();
+        });
+    }
+
     // --- Image Modal Logic ---
     if (modalCloseBtn && imageModal) {
         const closeModal = () => imageModal.classList.remove('is-visible');
@@ -867,7 +957,14 @@ function initFontPairingsGenerator() {
 
     const fetchAndProcessFonts = async () => {
         try {
-            const response = await fetch('/api/google-fonts');
+            // Only all-purpose fonts (regular and bold) in the categories used below, with just the fields we read.
+            const query = new URLSearchParams({
+                category: 'serif,sans-serif,display,handwriting',
+                variants: 'regular,700',
+                fields: 'family,category',
+                limit: '2000',
+            });
+            const response = await fetch(`/api/google-fonts?${query}`);
             const data = await response.json();
 
             if (!response.ok) {
@@ -875,9 +972,8 @@ function initFontPairingsGenerator() {
                 throw new Error(data.error || `API request failed with status ${response.status}`);
             }
             
-            // Filter fonts that have both a regular and a bold weight
-            const allPurposeFonts = data.items.filter(f => f.variants.includes('regular') && f.variants.includes('700'));
-            
+            const allPurposeFonts = data.items;
+
             categorizedFonts = {
                 serif: allPurposeFonts.filter(f => f.category === 'serif'),
                 'sans-serif': allPurposeFonts.filter(f => f.category === 'sans-serif'),
@@ -953,9 +1049,9 @@ function initFontPairingsGenerator() {
 
     generateBtn.addEventListener('click', () => {
         if (categorizedFonts) {
-            fetchAndProcessFonts();
-        } else {
             generateNewPairing();
+        } else {
+            fetchAndProcessFonts();
         }
     });
     